@@ -9,47 +9,71 @@ bl_info = {
 }
 
 import bpy
-from . import properties, ui, handlers, operators
+from . import properties, ui, operators, profiler, depsgraph_trace
 
 classes = (
 	properties.DoFVisualizerPreferences,
+	properties.DoFVizAreaSettings,
+	properties.DoFVizReportItem,
+	properties.DoFVizReport,
+	properties.DoFVizFocus,
+	properties.DoFVizScopeCollection,
+	properties.DoFVizScope,
+	ui.VIEW3D_PT_dof_viz_focus,
+	ui.DOF_VIZ_UL_scope_collections,
+	ui.VIEW3D_PT_dof_viz_scope,
+	ui.DOF_VIZ_UL_focus_report,
+	ui.VIEW3D_PT_dof_viz_report,
 )
 
 @bpy.app.handlers.persistent
 def load_post_handler(dummy):
-	"""Re-register handlers after file load if settings are enabled"""
-	# Clean up any existing dynamic properties and handlers
-	cleanup_dynamic_properties()
-	handlers.unregister_all_handlers()
+	"""Restore the overlay of viewports saved with it enabled"""
+	# Handlers of the previous file point at areas that no longer exist
+	unregister_overlay_handlers()
+	properties.clear_area_matches()
+	if properties.any_area_enabled(bpy.data.screens):
+		from . import handlers
+		handlers.restore_area_handlers(bpy.context)
 
-def cleanup_dynamic_properties():
-	"""Clean up all dynamic area-specific properties"""
-	wm = bpy.context.window_manager
-	props_to_remove = []
-
-	for prop_name in dir(wm):
-		if prop_name.startswith("dof_viz_"):
-			props_to_remove.append(prop_name)
-
-	for prop_name in props_to_remove:
-		try:
-			delattr(wm, prop_name)
-		except:
-			pass
+def unregister_overlay_handlers():
+	"""Remove the overlay handlers and the CoC map meshes, if those modules were ever loaded"""
+	handlers = operators.loaded_module("handlers")
+	if handlers is not None:
+		handlers.unregister_all_handlers()
+	coc_render = operators.loaded_module("coc_render")
+	if coc_render is not None:
+		coc_render.clear()
 
 def register():
 	operators.register()
 	for cls in classes:
 		bpy.utils.register_class(cls)
+	bpy.types.Screen.dof_viz_areas = bpy.props.CollectionProperty(type=properties.DoFVizAreaSettings)
+	bpy.types.Scene.dof_viz_report = bpy.props.PointerProperty(type=properties.DoFVizReport)
+	bpy.types.Scene.dof_viz_scope = bpy.props.PointerProperty(type=properties.DoFVizScope)
+	bpy.types.Scene.dof_viz_focus = bpy.props.PointerProperty(type=properties.DoFVizFocus)
 	bpy.types.VIEW3D_PT_overlay_motion_tracking.append(ui.draw_dof_viz_checkbox)
 	bpy.app.handlers.load_post.append(load_post_handler)
 
+	# Restore the profiler toggle saved in the preferences
+	addon = bpy.context.preferences.addons.get(__package__)
+	if addon:
+		profiler.set_enabled(addon.preferences.enable_profiler)
+
 def unregister():
-	handlers.unregister_all_handlers()
-	cleanup_dynamic_properties()
+	unregister_overlay_handlers()
+	profiler.set_enabled(False)
+	depsgraph_trace.stop_recording()
 	bpy.types.VIEW3D_PT_overlay_motion_tracking.remove(ui.draw_dof_viz_checkbox)
 	if load_post_handler in bpy.app.handlers.load_post:
 		bpy.app.handlers.load_post.remove(load_post_handler)
+	if bpy.app.timers.is_registered(properties.anchor_shown_areas):
+		bpy.app.timers.unregister(properties.anchor_shown_areas)
+	del bpy.types.Screen.dof_viz_areas
+	del bpy.types.Scene.dof_viz_report
+	del bpy.types.Scene.dof_viz_scope
+	del bpy.types.Scene.dof_viz_focus
 	for cls in reversed(classes):
 		bpy.utils.unregister_class(cls)
 	operators.unregister()
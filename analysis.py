@@ -0,0 +1,187 @@
+import csv
+import json
+
+import bpy
+import numpy as np
+
+from . import batch_cache, profiler, timeline
+
+#############################################################
+#
+# Focus Analysis
+# Classifies objects as near-blurred, in focus, far-blurred
+# or straddling for every frame of a range, by transforming
+# their bounding boxes into scene-camera space. Vectorized
+# over objects and frames with NumPy.
+#
+#############################################################
+
+NEAR, FOCUS, FAR, STRADDLE, BEHIND = range(5)
+CLASS_NAMES = ("near", "in_focus", "far", "straddle", "behind")
+
+# Corner selectors of a min/max AABB, in Blender's bound_box order
+_CORNER_MASK = np.array([
+	(0, 0, 0), (0, 0, 1), (0, 1, 1), (0, 1, 0),
+	(1, 0, 0), (1, 0, 1), (1, 1, 1), (1, 1, 0),
+], dtype=bool)
+
+def scene_batches(scene, state):
+	"""Cached overlay batches of `scene` (in the current view layer), without changing the active cache"""
+	if scene != bpy.context.scene:
+		return {}
+	return batch_cache.get_scene_batches(state, batch_cache.scene_key(scene, bpy.context.view_layer))
+
+def object_corners(objects, batches):
+	"""
+	Object-space bounding box corners as homogeneous coordinates, shape (O, 8, 4).
+	Uses the AABB of the cached batch in `batches` when available, otherwise Object.bound_box.
+	"""
+
+	corners = np.ones((len(objects), 8, 4), dtype=np.float32)
+	for i, obj in enumerate(objects):
+		cached = batches.get(obj.name)
+		if cached and cached.get("aabb") is not None:
+			lo, hi = cached["aabb"]
+			corners[i, :, :3] = np.where(_CORNER_MASK, hi, lo)
+		else:
+			corners[i, :, :3] = obj.bound_box
+	return corners
+
+def matrix_reader(objects):
+	"""
+	Function filling an (O, 4, 4) array with the current world matrices of `objects`,
+	using one foreach_get over all objects of the file instead of a loop over `objects`.
+	"""
+
+	all_objects = bpy.data.objects
+	pointers = {obj.as_pointer(): index for index, obj in enumerate(all_objects)}
+	indices = np.array([pointers[obj.as_pointer()] for obj in objects], dtype=np.int64)
+	buffer = np.empty(len(all_objects) * 16, dtype=np.float32)
+
+	def read(out):
+		all_objects.foreach_get("matrix_world", buffer)
+		# foreach_get flattens matrices column by column
+		out[:] = buffer.reshape(-1, 4, 4)[indices].transpose(0, 2, 1)
+	return read
+
+def depth_ranges(view_matrix, world_matrices, corners):
+	"""
+	Min/max scene-camera depth of each object's bounding box for one frame.
+	Only the view-space z row is needed: depth = -(V[2] @ M @ corner).
+	"""
+	z_row = np.einsum('j,ojk->ok', view_matrix[2], world_matrices)
+	depths = -np.einsum('ock,ok->oc', corners, z_row)
+	return depths.min(axis=1), depths.max(axis=1)
+
+def classify(depth_min, depth_max, dof_near, dof_far):
+	"""
+	Classify depth ranges against the DoF limits. Depth arrays are (F, O); limits are (F,).
+	Uses the same limits as the overlay (calculate_dof_info / shader).
+	"""
+	near = dof_near[:, None]
+	far = dof_far[:, None]
+	visible_min = np.maximum(depth_min, 0.0)
+
+	classes = np.full(depth_min.shape, STRADDLE, dtype=np.int8)
+	classes[(visible_min >= near) & (depth_max <= far)] = FOCUS
+	classes[depth_max < near] = NEAR
+	classes[visible_min > far] = FAR
+	classes[depth_max <= 0.0] = BEHIND
+	return classes
+
+@profiler.profiled("classify_objects")
+def classify_objects(scene, camera, objects, frames, state):
+	"""
+	Classify `objects` for every frame in `frames` in one pass over the frame range.
+	Returns a dict of NumPy arrays: classes/depth_min/depth_max are (F, O), DoF values (F,).
+	Bounding boxes are taken at the current frame; deforming meshes are approximated.
+	Raises ValueError when the camera has depth of field disabled, as nothing would be blurred.
+	"""
+
+	if not camera.data.dof.use_dof:
+		raise ValueError(f"Depth of field is disabled on camera '{camera.name}'")
+
+	objects = list(objects)
+	frames = np.asarray(frames, dtype=np.int32)
+	corners = object_corners(objects, scene_batches(scene, state))
+	depth_min = np.empty((len(frames), len(objects)), dtype=np.float32)
+	depth_max = np.empty((len(frames), len(objects)), dtype=np.float32)
+	world_matrices = np.empty((len(objects), 4, 4), dtype=np.float32)
+	read_world_matrices = matrix_reader(objects)
+
+	def on_frame(i, samples):
+		read_world_matrices(world_matrices)
+		depth_min[i], depth_max[i] = depth_ranges(samples["view_matrix"][i], world_matrices, corners)
+
+	samples = timeline.sample_and_solve(scene, camera, frames, state, on_frame)
+
+	return {
+		"objects": [obj.name for obj in objects],
+		"frames": frames,
+		"classes": classify(depth_min, depth_max, samples["dof_near"], samples["dof_far"]),
+		"depth_min": depth_min,
+		"depth_max": depth_max,
+		"focus_distance": samples["focus_distance"],
+		"dof_near": samples["dof_near"],
+		"dof_far": samples["dof_far"],
+	}
+
+def class_counts(classes):
+	"""Number of frames spent in each class, per object: (O, len(CLASS_NAMES))"""
+	return np.stack([(classes == index).sum(axis=0) for index in range(len(CLASS_NAMES))], axis=1)
+
+# --- Report ---
+def store_report(scene, result):
+	"""Write per-object frame counts to the scene's report collection for the panel"""
+
+	report = scene.dof_viz_report
+	report.items.clear()
+	report.camera = scene.camera.name if scene.camera else ""
+	report.frame_start = int(result["frames"][0]) if len(result["frames"]) else 0
+	report.frame_end = int(result["frames"][-1]) if len(result["frames"]) else 0
+
+	counts = class_counts(result["classes"])
+	for name, row in zip(result["objects"], counts):
+		item = report.items.add()
+		item.name = name
+		item.near_frames = int(row[NEAR])
+		item.focus_frames = int(row[FOCUS])
+		item.far_frames = int(row[FAR])
+		item.straddle_frames = int(row[STRADDLE])
+		item.behind_frames = int(row[BEHIND])
+
+def report_rows(report):
+	for item in report.items:
+		yield {
+			"object": item.name,
+			"near_frames": item.near_frames,
+			"in_focus_frames": item.focus_frames,
+			"far_frames": item.far_frames,
+			"straddle_frames": item.straddle_frames,
+			"behind_frames": item.behind_frames,
+		}
+
+def export_report(report, filepath):
+	"""Export the report as CSV or JSON depending on the file extension"""
+	rows = list(report_rows(report))
+	if filepath.lower().endswith(".json"):
+		with open(filepath, "w", encoding="utf-8") as f:
+			json.dump({
+				"camera": report.camera,
+				"frame_start": report.frame_start,
+				"frame_end": report.frame_end,
+				"objects": rows,
+			}, f, indent=2)
+		return
+
+	with open(filepath, "w", newline="", encoding="utf-8") as f:
+		writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()) if rows else ["object"])
+		writer.writeheader()
+		writer.writerows(rows)
+
+def default_objects(context):
+	"""Objects analyzed by default: visible meshes, or the selection if any"""
+	selected = [obj for obj in context.selected_objects if obj.type == 'MESH']
+	if selected:
+		return selected
+	return [obj for obj in context.visible_objects if obj.type == 'MESH']
@@ -0,0 +1,96 @@
+import bpy
+import numpy as np
+
+from . import analysis, batch_cache, bvh_cache, dof_math, focus, timeline
+from .handlers import dof_viz_state
+
+#############################################################
+#
+# Python API
+# Stable entry points for pipeline tools (shot validators,
+# layout checks...) that need DoF values and per-object focus
+# state without driving the viewport. Served from the same
+# memoized solve, timeline and batch caches as the overlay.
+#
+#############################################################
+
+API_VERSION = 1
+
+# Focus classes of classify_objects()["classes"]
+NEAR = analysis.NEAR
+FOCUS = analysis.FOCUS
+FAR = analysis.FAR
+STRADDLE = analysis.STRADDLE
+BEHIND = analysis.BEHIND
+CLASS_NAMES = analysis.CLASS_NAMES
+
+def get_dof(camera, frame=None, scene=None):
+	"""
+	DoF of `camera` at `frame` (default: current frame) as a dict with focus_distance,
+	dof_near, dof_far and hyperfocal, in meters (far and hyperfocal are inf when unbounded).
+	Read from the precomputed timeline when it covers the frame, otherwise solved;
+	other frames than the current one are evaluated by stepping the scene and restoring it.
+	"""
+
+	scene = scene or bpy.context.scene
+	frame = scene.frame_current if frame is None else int(frame)
+
+	cached = timeline.get_cached_info(dof_viz_state, scene, camera, frame, memoize=False)
+	if cached is not None:
+		return cached
+
+	if frame != scene.frame_current:
+		samples = timeline.sample_and_solve(scene, camera, np.array([frame], dtype=np.int32), dof_viz_state)
+		return {
+			"focus_distance": float(samples["focus_distance"][0]),
+			"dof_near": float(samples["dof_near"][0]),
+			"dof_far": float(samples["dof_far"][0]),
+			"hyperfocal": float(samples["hyperfocal"][0]),
+		}
+
+	depsgraph = bpy.context.evaluated_depsgraph_get()
+	cam_eval = camera.evaluated_get(depsgraph)
+	cam_data = cam_eval.data
+	# Focus trees kept per object are only invalidated by the overlay's depsgraph handler
+	cached = dof_viz_state["depsgraph_handler"] is not None
+	return dof_math.dof_info(
+		cam_data.lens / 1000.0,
+		cam_data.dof.aperture_fstop,
+		cam_data.sensor_width / 1000.0,
+		focus.focus_distance(scene, cam_eval, depsgraph, cached),
+	)
+
+def classify_objects(objects, camera, frames, scene=None):
+	"""
+	Classify `objects` against the DoF of `camera` for every frame of `frames` in one pass.
+	Returns a dict of NumPy arrays: "classes", "depth_min" and "depth_max" are (frames, objects),
+	"focus_distance", "dof_near" and "dof_far" are (frames,); "objects" lists the object names.
+	Class values are NEAR, FOCUS, FAR, STRADDLE and BEHIND. Bounding boxes come from the
+	overlay's batch cache when available and are taken at the current frame.
+	Raises ValueError when `camera` has depth of field disabled.
+	"""
+
+	scene = scene or bpy.context.scene
+	return analysis.classify_objects(scene, camera, objects, frames, dof_viz_state)
+
+def cache_stats():
+	"""
+	Counters of the add-on caches: overlay batches (count, bytes, builds, evictions, rebuilds),
+	the share of batches served from shared geometry ("hit_rate"), the share of depsgraph
+	updates served without batch work ("idle_rate"), and hits/misses of the DoF solve and BVH caches.
+	"""
+
+	stats = dict(batch_cache.get_stats(dof_viz_state))
+	batches = dof_viz_state["mesh_batches"]
+	stats["batch_count"] = len(batches)
+	stats["batch_bytes"] = sum(data.get("nbytes", 0) for data in batches.values())
+	requests = stats["batch_builds"] + stats["geometry_reuses"]
+	stats["hit_rate"] = stats["geometry_reuses"] / requests if requests else 0.0
+	stats["idle_rate"] = stats["idle_updates"] / stats["updates"] if stats["updates"] else 0.0
+
+	solve_info = dof_math.solve_dof.cache_info()
+	stats["solve_hits"] = solve_info.hits
+	stats["solve_misses"] = solve_info.misses
+	stats["bvh_hits"] = bvh_cache.bvh_cache_state["hits"]
+	stats["bvh_misses"] = bvh_cache.bvh_cache_state["misses"]
+	return stats
@@ -0,0 +1,278 @@
+import itertools
+
+from . import profiler
+
+#############################################################
+#
+# Batch Cache Bookkeeping
+# Storage, eviction and statistics for the per-object batch
+# cache kept in state["mesh_batches"]. Entries are opaque
+# here, so this module has no bpy or gpu dependency.
+#
+# There is one cache per (scene, view layer); the active one
+# lives in the state's top-level fields and the others are
+# stashed in state["scene_caches"], least recently used
+# first and within a memory budget. Extracted geometry is
+# shared between caches through state["geometry"], keyed by
+# mesh identity, so switching scenes reuses existing batches.
+#
+#############################################################
+
+def new_stats():
+	return {
+		"updates": 0,         # depsgraph updates processed
+		"idle_updates": 0,    # updates that required no batch work
+		"full_rebuilds": 0,   # recreate_all plans executed
+		"batch_builds": 0,    # single batches (re)built
+		"geometry_reuses": 0, # batches served from shared geometry
+		"evictions": 0,       # batches dropped
+	}
+
+def get_stats(state):
+	return state.setdefault("cache_stats", new_stats())
+
+# --- Scene Caches ---
+SCENE_FIELDS = ("mesh_batches", "cached_visible_meshes", "current_camera", "complete", "scope")
+
+# Batch bytes of the stashed scene caches kept for switching back
+MAX_STASHED_BYTES = 512 * 1024 * 1024
+
+def scene_key(scene, view_layer):
+	"""Cache key of a scene and view layer; the scene's session_uid survives renames"""
+	return (scene.session_uid, view_layer.name)
+
+def new_scene_cache():
+	return {
+		"mesh_batches": {},
+		"cached_visible_meshes": set(),
+		"current_camera": None,
+		"complete": False,  # False while visible objects may lack a batch
+		"scope": {},  # scope.filter_names results
+	}
+
+def select_scene(state, key):
+	"""Make the cache of `key` the active one, stashing the current one"""
+	current = state.get("scene_key")
+	if current == key:
+		return
+
+	caches = state.setdefault("scene_caches", {})
+	if current is not None:
+		# Most recently used last
+		caches.pop(current, None)
+		caches[current] = {field: state.get(field) for field in SCENE_FIELDS}
+		state.update(caches.pop(key, None) or new_scene_cache())
+	else:
+		# Batches built before any scene was selected belong to the first one
+		state.setdefault("complete", bool(state["mesh_batches"]))
+	state["scene_key"] = key
+	if current is not None:
+		trim_scene_caches(state)
+
+def cache_bytes(cache):
+	return sum(entry.get("nbytes", 0) for entry in cache["mesh_batches"].values())
+
+def trim_scene_caches(state, budget=MAX_STASHED_BYTES):
+	"""Drop the least recently used stashed caches until the others fit in `budget` bytes"""
+	caches = state.get("scene_caches", {})
+	sizes = {key: cache_bytes(cache) for key, cache in caches.items()}
+	total = sum(sizes.values())
+	evicted = 0
+	for key in list(caches):
+		if total <= budget:
+			break
+		total -= sizes[key]
+		evicted += len(caches.pop(key)["mesh_batches"])
+
+	if evicted:
+		get_stats(state)["evictions"] += evicted
+		prune_geometry(state)
+
+def prune_scenes(state, keys):
+	"""
+	Drop the caches of scenes and view layers that no longer exist, `keys` being the
+	existing ones. A cache whose view layer was renamed follows it when its scene has
+	exactly one view layer without a cache.
+	"""
+	caches = state.setdefault("scene_caches", {})
+	active = state.get("scene_key")
+	cached = set(caches) | ({active} if active is not None else set())
+	stale = [key for key in cached if key not in keys]
+	if not stale:
+		return
+
+	evicted = 0
+	for key in stale:
+		uncached = [other for other in keys if other[0] == key[0] and other not in cached]
+		renamed = uncached[0] if len(uncached) == 1 else None
+		if renamed is not None:
+			cached.add(renamed)
+		if key == active:
+			if renamed is None:
+				evicted += len(state["mesh_batches"])
+				state.update(new_scene_cache())
+			state["scene_key"] = renamed
+		else:
+			cache = caches.pop(key)
+			if renamed is None:
+				evicted += len(cache["mesh_batches"])
+			else:
+				caches[renamed] = cache
+
+	if evicted:
+		get_stats(state)["evictions"] += evicted
+		prune_geometry(state)
+
+def scene_cache(state, key):
+	"""Field dict of the cache of `key` (the state itself when active), or None"""
+	if state.get("scene_key") == key:
+		return state
+	return state.get("scene_caches", {}).get(key)
+
+def scope_cache(state):
+	"""Scope results of the active scene, see scope.filter_names"""
+	if state.get("scope") is None:
+		state["scope"] = {}
+	return state["scope"]
+
+def get_scene_batches(state, key):
+	"""Batches of the cache of `key`, active or stashed, without selecting it"""
+	cache = scene_cache(state, key)
+	return cache["mesh_batches"] if cache else {}
+
+def scene_caches(state):
+	"""Field dicts of every scene cache, the active one being the state itself"""
+	yield state
+	for key, cache in state.get("scene_caches", {}).items():
+		if key != state.get("scene_key"):
+			yield cache
+
+# --- Batches ---
+# Entry versions, kept apart from the stats so they never repeat within a session
+_versions = itertools.count(1)
+
+def store_batch(state, name, entry, reused=False):
+	"""
+	Store a batch entry. Built entries are tagged with a version that changes on every
+	rebuild; entries reusing shared geometry keep the version of that geometry.
+	"""
+	stats = get_stats(state)
+	if reused:
+		stats["geometry_reuses"] += 1
+	else:
+		stats["batch_builds"] += 1
+		entry["version"] = next(_versions)
+	state["mesh_batches"][name] = entry
+
+def mesh_users(state):
+	"""Mesh name -> names of the objects whose batch was built from it, in the active cache or a scene_cache"""
+	users = {}
+	for name, entry in state["mesh_batches"].items():
+		if entry.get("data") is not None:
+			users.setdefault(entry["data"], set()).add(name)
+	return users
+
+def evict_batches(state, names, cache=None):
+	"""Drop the batches of `names` from the active cache, or from the scene_cache `cache`"""
+	batches = (cache or state)["mesh_batches"]
+	evicted = 0
+	for name in names:
+		if batches.pop(name, None) is not None:
+			evicted += 1
+	get_stats(state)["evictions"] += evicted
+	if evicted:
+		prune_geometry(state)
+	return evicted
+
+def clear(state):
+	"""Drop the batches of the active scene (shared geometry is kept for the rebuild)"""
+	state["mesh_batches"].clear()
+
+def clear_all(state):
+	"""Drop the batches of every scene and all shared geometry"""
+	state.update(new_scene_cache())
+	state["scene_caches"] = {}
+	state["scene_key"] = None
+	state["geometry"] = {}
+
+# --- Shared Geometry ---
+def get_geometry(state, key):
+	"""Entry of the first batch built from geometry `key`, or None"""
+	return state.setdefault("geometry", {}).get(key)
+
+def store_geometry(state, key, source, entry):
+	"""Share a built entry; `source` is the object or mesh name whose updates invalidate it"""
+	entry["geometry"] = key
+	entry["source"] = source
+	state.setdefault("geometry", {})[key] = entry
+
+def invalidate_geometry(state, names=None):
+	"""
+	Drop shared geometry built from the objects or meshes `names` (all when None), and the
+	batches using it in every scene. Scenes left with missing batches are marked incomplete;
+	the active scene's `names` are expected to be rebuilt by the caller.
+	"""
+
+	geometry = state.setdefault("geometry", {})
+	stale = {key for key, entry in geometry.items() if names is None or entry["source"] in names}
+	for key in stale:
+		del geometry[key]
+	if not stale:
+		return
+
+	for cache in scene_caches(state):
+		batches = cache["mesh_batches"]
+		for name in [name for name, entry in batches.items() if entry.get("geometry") in stale]:
+			del batches[name]
+			if cache is not state or names is None or name not in names:
+				cache["complete"] = False
+
+def prune_geometry(state):
+	"""Drop shared geometry no scene uses anymore"""
+	geometry = state.get("geometry")
+	if not geometry:
+		return
+	used = {entry.get("geometry") for cache in scene_caches(state) for entry in cache["mesh_batches"].values()}
+	for key in [key for key in geometry if key not in used]:
+		del geometry[key]
+
+def apply_plan(state, plan, rebuild_all, rebuild_some):
+	"""
+	Execute a change_detection plan against the cache.
+	`rebuild_all()` recreates every batch, `rebuild_some(names)` the given ones.
+	Returns True if any batch changed.
+	"""
+
+	stats = get_stats(state)
+	stats["updates"] += 1
+
+	if plan["dirty_all"]:
+		invalidate_geometry(state)
+	elif plan["dirty"]:
+		invalidate_geometry(state, plan["dirty"])
+
+	if plan["visible"] is not None:
+		state["cached_visible_meshes"] = plan["visible"]
+	if plan["evict"]:
+		evict_batches(state, plan["evict"])
+
+	if plan["recreate_all"]:
+		stats["full_rebuilds"] += 1
+		rebuild_all()
+		return True
+
+	if plan["rebuild"]:
+		rebuild_some(plan["rebuild"])
+		return True
+
+	if not plan["evict"]:
+		stats["idle_updates"] += 1
+	return bool(plan["evict"])
+
+def publish_counters(state):
+	"""Publish batch count and vertex buffer size to the profiler"""
+	if not profiler.is_enabled():
+		return
+	batches = state["mesh_batches"]
+	profiler.set_counter("batch_count", len(batches))
+	profiler.set_counter("batch_bytes", sum(data.get("nbytes", 0) for data in batches.values()))
@@ -4,28 +4,80 @@ import numpy as np
 from gpu_extras.batch import batch_for_shader
 
 from .shaders import vertex_shader, fragment_shader
+from . import profiler, batch_cache, scope
 
 
+@profiler.profiled("create_batches")
 def create_batches(context, state):
-	"""Create GPU batches for all visible mesh objects in the scene."""
+	"""Create GPU batches for all visible mesh objects in the scene's overlay scope."""
 
-	state["mesh_batches"].clear()
-	if state["shader"] is None:
+	batch_cache.select_scene(state, batch_cache.scene_key(context.scene, context.view_layer))
+	batch_cache.clear(state)
+	if state["shader"] is None and state.get("upload_batches", True):
 		state["shader"] = gpu.types.GPUShader(vertex_shader, fragment_shader)
 
 	depsgraph = context.evaluated_depsgraph_get()
-	visible_meshes = {obj.name for obj in context.visible_objects if obj.type == 'MESH'}
+	meshes = [obj for obj in context.visible_objects if obj.type == 'MESH']
+	visible_meshes = scope.filter_names(context.scene, meshes, batch_cache.scope_cache(state))
+	scoped_meshes = [obj for obj in meshes if obj.name in visible_meshes]
 
 	# Process objects in parallel-friendly way
-	for obj in context.visible_objects:
-		if obj.type == 'MESH' and obj.data:
+	for obj in scoped_meshes:
+		if obj.data:
 			create_single_batch(obj, depsgraph, state)
 
-	# Cache the current visible meshes for comparison
+	# Cache the current visible meshes and camera for comparison
 	state["cached_visible_meshes"] = visible_meshes
+	state["current_camera"] = context.scene.camera.name if context.scene.camera else None
+	state["complete"] = True
+	batch_cache.prune_geometry(state)
+	batch_cache.publish_counters(state)
+
+def create_batches_sliced(scene, view_layer, state, clear=True):
+	"""
+	Generator version of create_batches yielding after each batch, so the build can be
+	spread over timer ticks. Timers have no window context, so visibility comes from the view layer.
+	Without `clear`, existing batches are kept and only missing ones are built.
+	"""
+
+	key = batch_cache.scene_key(scene, view_layer)
+	batch_cache.select_scene(state, key)
+	if clear:
+		batch_cache.clear(state)
+	if state["shader"] is None and state.get("upload_batches", True):
+		state["shader"] = gpu.types.GPUShader(vertex_shader, fragment_shader)
+
+	meshes = [obj for obj in view_layer.objects if obj.type == 'MESH' and obj.visible_get(view_layer=view_layer)]
+	inside = scope.filter_names(scene, meshes, batch_cache.scope_cache(state))
+	names = [obj.name for obj in meshes if obj.name in inside]
+	batch_cache.evict_batches(state, set(state["mesh_batches"]).difference(names))
+	state["cached_visible_meshes"] = set(names)
+	state["current_camera"] = scene.camera.name if scene.camera else None
+
+	depsgraph = view_layer.depsgraph
+	for name in names:
+		# Other scenes may have been drawn or updated since the last step
+		batch_cache.select_scene(state, key)
+
+		# Depsgraph updates during the build may have built or dropped the batch already
+		if name in state["mesh_batches"] or name not in state["cached_visible_meshes"]:
+			continue
+		obj = scene.objects.get(name)
+		if obj is not None and obj.data:
+			create_single_batch(obj, depsgraph, state)
+			yield
 
+	batch_cache.select_scene(state, key)
+	state["complete"] = True
+	batch_cache.prune_geometry(state)
+	batch_cache.publish_counters(state)
+
+@profiler.profiled("update_specific_batches")
 def update_specific_batches(context, changed_objects, state):
-	"""Update GPU batches only for objects that have changed geometry."""
+	"""
+	Update GPU batches only for objects that have changed geometry.
+	`changed_objects` comes from a change_detection plan, already limited to the scope.
+	"""
 
 	depsgraph = context.evaluated_depsgraph_get()
 
@@ -34,60 +86,137 @@ def update_specific_batches(context, changed_objects, state):
 		if obj and obj.type == 'MESH' and obj.visible_get():
 			create_single_batch(obj, depsgraph, state)
 
-def create_single_batch(obj, depsgraph, state):
-	"""Create a single GPU batch for the given object with optimizations."""
+	batch_cache.publish_counters(state)
+
+def extract_mesh_arrays(obj, depsgraph):
+	"""
+	Extract per-corner triangle positions and normals from the evaluated mesh.
+	Returns None when the mesh has no triangles. This is the CPU part of batch
+	creation and does not require a GPU context.
+	"""
+
+	indexed = extract_indexed_mesh(obj, depsgraph)
+	if indexed is None:
+		return None
+	return gather_triangles(*indexed)
+
+def gather_triangles(vertex_positions, vertex_normals, loop_triangle_indices):
+	"""Expand indexed vertex data to per-corner triangle positions and normals"""
+
+	with profiler.stage("gather"):
+		# Direct indexing for triangle data
+		tris_vertices = vertex_positions[loop_triangle_indices]
+		tris_normals = vertex_normals[loop_triangle_indices]
+
+	return tris_vertices, tris_normals
+
+def extract_indexed_mesh(obj, depsgraph):
+	"""
+	Extract vertex positions, vertex normals (both (V, 3)) and flat triangle vertex
+	indices (T * 3) from the evaluated mesh, or None when it has no triangles.
+	"""
+
+	obj_eval = None
+	with profiler.stage("to_mesh"):
+		try:
+			obj_eval = obj.evaluated_get(depsgraph)
+			mesh = obj_eval.to_mesh()
+		except:
+			mesh = obj.data
 
 	try:
-		obj_eval = obj.evaluated_get(depsgraph)
-		mesh = obj_eval.to_mesh()
-	except:
-		mesh = obj.data
+		if not mesh.vertices or not mesh.loops:
+			return None
 
-	if not mesh.vertices or not mesh.loops:
-		if 'to_mesh_clear' in dir(obj_eval): 
-			obj_eval.to_mesh_clear()
-		return
+		with profiler.stage("foreach_get"):
+			# Pre-allocate arrays with correct size
+			vertex_count = len(mesh.vertices)
+			vertex_positions = np.empty(vertex_count * 3, dtype=np.float32)
+			vertex_normals = np.empty(vertex_count * 3, dtype=np.float32)
+
+			# Use foreach_get for faster data access
+			mesh.vertices.foreach_get("co", vertex_positions)
+			mesh.vertices.foreach_get("normal", vertex_normals)
 
-	# Pre-allocate arrays with correct size
-	vertex_count = len(mesh.vertices)
-	vertex_positions = np.empty(vertex_count * 3, dtype=np.float32)
-	vertex_normals = np.empty(vertex_count * 3, dtype=np.float32)
+			# Reshape in-place
+			vertex_positions.shape = (-1, 3)
+			vertex_normals.shape = (-1, 3)
 
-	# Use foreach_get for faster data access
-	mesh.vertices.foreach_get("co", vertex_positions)
-	mesh.vertices.foreach_get("normal", vertex_normals)
+			# Calculate triangles once
+			mesh.calc_loop_triangles()
+			triangle_count = len(mesh.loop_triangles)
 
-	# Reshape in-place
-	vertex_positions.shape = (-1, 3)
-	vertex_normals.shape = (-1, 3)
+			if triangle_count == 0:
+				return None
 
-	# Calculate triangles once
-	mesh.calc_loop_triangles()
-	triangle_count = len(mesh.loop_triangles)
+			# Pre-allocate triangle indices
+			loop_triangle_indices = np.empty(triangle_count * 3, dtype=np.int32)
+			mesh.loop_triangles.foreach_get("vertices", loop_triangle_indices)
 
-	if triangle_count == 0:
-		if 'to_mesh_clear' in dir(obj_eval): 
+		return vertex_positions, vertex_normals, loop_triangle_indices
+	finally:
+		if obj_eval is not None and 'to_mesh_clear' in dir(obj_eval): 
 			obj_eval.to_mesh_clear()
-		return
 
-	# Pre-allocate triangle indices
-	loop_triangle_indices = np.empty(triangle_count * 3, dtype=np.int32)
-	mesh.loop_triangles.foreach_get("vertices", loop_triangle_indices)
+def geometry_key(obj, scene_key):
+	"""
+	Mesh identity of the evaluated mesh of `obj`, and the object or mesh name whose updates
+	invalidate it. Meshes without modifiers or shape keys evaluate to their data, so all
+	their users (linked duplicates, other scenes) share one batch; others are per scene.
+	"""
+	if not obj.modifiers and obj.data.shape_keys is None:
+		return ('MESH', obj.data.session_uid), obj.data.name
+	return ('OBJECT', scene_key, obj.session_uid), obj.name
+
+def drop_contour_geometry(state):
+	"""Release the indexed geometry of the exact contour lines from every batch entry"""
+	entries = list(state.get("geometry", {}).values())
+	for cache in batch_cache.scene_caches(state):
+		entries.extend(cache["mesh_batches"].values())
+	for entry in entries:
+		if entry.get("positions") is not None:
+			entry["nbytes"] -= entry["positions"].nbytes + entry["triangles"].nbytes
+			entry["positions"] = None
+			entry["triangles"] = None
 
-	# Direct indexing for triangle data
-	tris_vertices = vertex_positions[loop_triangle_indices]
-	tris_normals = vertex_normals[loop_triangle_indices]
+def create_single_batch(obj, depsgraph, state):
+	"""Create a single GPU batch for the given object with optimizations."""
 
-	# Create batch
-	batch = batch_for_shader(
-		state["shader"], 'TRIS', 
-		{"pos": tris_vertices, "normal": tris_normals}
-	)
+	key, source = geometry_key(obj, state.get("scene_key"))
+	shared = batch_cache.get_geometry(state, key)
+	if shared is not None:
+		batch_cache.store_batch(state, obj.name, dict(shared, matrix=obj.matrix_world), reused=True)
+		return
 
-	state["mesh_batches"][obj.name] = {
+	indexed = extract_indexed_mesh(obj, depsgraph)
+	if indexed is None:
+		return
+	vertex_positions, vertex_normals, loop_triangle_indices = indexed
+	tris_vertices, tris_normals = gather_triangles(vertex_positions, vertex_normals, loop_triangle_indices)
+
+	# The upload can be skipped (e.g. benchmarks on machines without a GPU)
+	batch = None
+	if state.get("upload_batches", True):
+		with profiler.stage("upload"):
+			batch = batch_for_shader(
+				state["shader"], 'TRIS', 
+				{"pos": tris_vertices, "normal": tris_normals}
+			)
+
+	entry = {
 		"batch": batch,
-		"matrix": obj.matrix_world
+		"matrix": obj.matrix_world,
+		"data": obj.data.name,  # mesh name, maps mesh data updates to the objects using it
+		"nbytes": tris_vertices.nbytes + tris_normals.nbytes,
+		# Object-space bounds of the evaluated mesh, reused by the focus analysis
+		"aabb": (vertex_positions.min(axis=0), vertex_positions.max(axis=0)),
+		# Indexed object-space geometry of the exact contour lines, kept only while they are used
+		"positions": None,
+		"triangles": None,
 	}
-
-	if 'to_mesh_clear' in dir(obj_eval): 
-		obj_eval.to_mesh_clear()
+	if state.get("contour_geometry"):
+		entry["positions"] = vertex_positions
+		entry["triangles"] = loop_triangle_indices.reshape(-1, 3)
+		entry["nbytes"] += vertex_positions.nbytes + loop_triangle_indices.nbytes
+	batch_cache.store_batch(state, obj.name, entry)
+	batch_cache.store_geometry(state, key, source, entry)
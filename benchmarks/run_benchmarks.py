@@ -0,0 +1,398 @@
+"""
+Headless benchmarks for the DoF visualizer batch pipeline.
+
+Run inside Blender in background mode against generated synthetic scenes:
+
+	blender --background --factory-startup --python benchmarks/run_benchmarks.py -- \
+		--objects 200 --triangles 5000 --output results.json
+
+Compare a run against a saved baseline (works with plain Python, no Blender needed):
+
+	python benchmarks/run_benchmarks.py --compare results.json --baseline baseline.json
+
+The GPU upload step is skipped unless --gpu is given, so the extraction pipeline
+can be measured on machines without a GPU. Pass --baseline together with a
+Blender run to compare right away. The process exits with status 1 when a
+regression is flagged.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_NAME = "alcove_dof_visualizer"
+
+CASES = ("startup", "extract", "create_batches", "update_specific_batches", "depsgraph_update")
+
+# Modules that should only be imported once the overlay is enabled
+OVERLAY_MODULES = ("handlers", "batches", "shaders", "contours", "timeline", "analysis", "coc_render")
+
+
+# --- Arguments ---
+def parse_args():
+	argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+
+	parser = argparse.ArgumentParser(description="Benchmark the DoF visualizer batch pipeline")
+	parser.add_argument("--objects", type=int, default=100, help="Number of mesh objects")
+	parser.add_argument("--triangles", type=int, default=2000, help="Triangles per object (before modifiers)")
+	parser.add_argument("--linked", type=float, default=0.25, help="Fraction of objects sharing one mesh")
+	parser.add_argument("--modifiers", type=float, default=0.25, help="Fraction of objects with a modifier stack")
+	parser.add_argument("--deforming", type=float, default=0.1, help="Fraction of objects deformed over time")
+	parser.add_argument("--repeat", type=int, default=5, help="Timed repetitions per case")
+	parser.add_argument("--steps", type=int, default=50, help="Depsgraph updates for the throughput case")
+	parser.add_argument("--cases", nargs="+", choices=CASES, default=list(CASES))
+	parser.add_argument("--gpu", action="store_true", help="Include the GPU upload step")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--output", help="Write results to this JSON file")
+	parser.add_argument("--compare", help="Results JSON to compare (skips running benchmarks)")
+	parser.add_argument("--baseline", help="Baseline results JSON to flag regressions against")
+	parser.add_argument("--threshold", type=float, default=0.15, help="Relative slowdown counted as regression")
+	parser.add_argument("--min-delta-ms", type=float, default=0.5, help="Ignore slowdowns smaller than this")
+	return parser.parse_args(argv)
+
+
+# --- Add-on Loading ---
+def load_addon():
+	"""Import the add-on package from this checkout without registering it"""
+	if PACKAGE_NAME in sys.modules:
+		return sys.modules[PACKAGE_NAME]
+
+	spec = importlib.util.spec_from_file_location(
+		PACKAGE_NAME, os.path.join(REPO_DIR, "__init__.py"),
+		submodule_search_locations=[REPO_DIR],
+	)
+	module = importlib.util.module_from_spec(spec)
+	sys.modules[PACKAGE_NAME] = module
+	spec.loader.exec_module(module)
+	return module
+
+
+# --- Synthetic Scenes ---
+def grid_mesh(name, triangles):
+	"""Create a wavy grid mesh with roughly the requested triangle count"""
+	import bpy
+
+	quads = max(1, triangles // 2)
+	cols = max(1, int(quads ** 0.5))
+	rows = max(1, quads // cols)
+
+	verts = [
+		(x / cols - 0.5, y / rows - 0.5, 0.05 * ((x * 7 + y * 3) % 5))
+		for y in range(rows + 1) for x in range(cols + 1)
+	]
+	faces = []
+	for y in range(rows):
+		for x in range(cols):
+			i = y * (cols + 1) + x
+			faces.append((i, i + 1, i + cols + 2, i + cols + 1))
+
+	mesh = bpy.data.meshes.new(name)
+	mesh.from_pydata(verts, [], faces)
+	mesh.update()
+	return mesh
+
+def build_scene(args):
+	"""Reset to an empty file and generate the parametric benchmark scene"""
+	import bpy
+
+	bpy.ops.wm.read_factory_settings(use_empty=True)
+	rng = random.Random(args.seed)
+	scene = bpy.context.scene
+
+	cam_data = bpy.data.cameras.new("BenchCamera")
+	cam_data.dof.use_dof = True
+	cam_data.dof.focus_distance = 10.0
+	cam_data.dof.aperture_fstop = 2.8
+	camera = bpy.data.objects.new("BenchCamera", cam_data)
+	scene.collection.objects.link(camera)
+	camera.location = (0.0, -25.0, 5.0)
+	camera.rotation_euler = (1.35, 0.0, 0.0)
+	scene.camera = camera
+
+	shared_mesh = grid_mesh("BenchShared", args.triangles)
+	linked = int(args.objects * args.linked)
+	with_modifiers = int(args.objects * args.modifiers)
+	deforming = int(args.objects * args.deforming)
+
+	for i in range(args.objects):
+		if i < linked:
+			kind, mesh = "linked", shared_mesh
+		else:
+			kind, mesh = "unique", grid_mesh(f"BenchMesh.{i:05d}", args.triangles)
+
+		obj = bpy.data.objects.new(f"Bench.{kind}.{i:05d}", mesh)
+		scene.collection.objects.link(obj)
+		obj.location = (rng.uniform(-20, 20), rng.uniform(-5, 60), rng.uniform(0, 5))
+		obj.rotation_euler = (0.0, 0.0, rng.uniform(0, 6.28))
+
+		if linked <= i < linked + with_modifiers:
+			obj.modifiers.new("Bevel", 'BEVEL').width = 0.01
+			obj.modifiers.new("Triangulate", 'TRIANGULATE')
+		if i >= args.objects - deforming:
+			wave = obj.modifiers.new("Wave", 'WAVE')
+			wave.height = 0.2
+			wave.speed = 0.5
+
+	scene.frame_start, scene.frame_end = 1, 250
+	scene.frame_set(1)
+	bpy.context.view_layer.update()
+	return scene
+
+
+# --- Measurement ---
+def timed(func, repeat):
+	"""Run func repeatedly and return timing statistics in milliseconds"""
+	samples = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		func()
+		samples.append((time.perf_counter() - start) * 1000.0)
+	samples.sort()
+	return {
+		"median_ms": statistics.median(samples),
+		"min_ms": samples[0],
+		"max_ms": samples[-1],
+		"repeat": repeat,
+	}
+
+def peak_memory(func):
+	"""Peak Python/NumPy allocation (MB) during a single run"""
+	tracemalloc.start()
+	try:
+		func()
+		_, peak = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+	return peak / (1024 * 1024)
+
+def measure_startup(args):
+	"""
+	Cost of the add-on for sessions that never enable the overlay: import and register
+	time, the load_post handler, and which overlay modules got imported on the way.
+	Must run before anything else imports the add-on.
+	"""
+
+	start = time.perf_counter()
+	addon = load_addon()
+	import_ms = (time.perf_counter() - start) * 1000.0
+
+	start = time.perf_counter()
+	addon.register()
+	register_ms = (time.perf_counter() - start) * 1000.0
+
+	try:
+		load_post = timed(lambda: addon.load_post_handler(None), args.repeat)
+		loaded = [name for name in OVERLAY_MODULES if f"{PACKAGE_NAME}.{name}" in sys.modules]
+	finally:
+		addon.unregister()
+
+	return {
+		"median_ms": import_ms + register_ms,
+		"import_ms": import_ms,
+		"register_ms": register_ms,
+		"load_post_ms": load_post["median_ms"],
+		"overlay_modules_loaded": loaded,
+	}
+
+def new_state(args):
+	return {
+		"area_handlers": {},
+		"depsgraph_handler": None,
+		"shader": None,
+		"mesh_batches": {},
+		"info_data": {},
+		"upload_batches": args.gpu,
+	}
+
+def run_benchmarks(args):
+	import bpy
+
+	results = {}
+	if "startup" in args.cases:
+		results["startup"] = measure_startup(args)
+
+	addon = load_addon()
+	batches = importlib.import_module(f"{PACKAGE_NAME}.batches")
+	handlers = importlib.import_module(f"{PACKAGE_NAME}.handlers")
+	batch_cache = importlib.import_module(f"{PACKAGE_NAME}.batch_cache")
+	profiler = addon.profiler
+
+	scene = build_scene(args)
+	context = bpy.context
+	meshes = [obj for obj in context.visible_objects if obj.type == 'MESH']
+	rng = random.Random(args.seed)
+
+	profiler.set_enabled(True)
+
+	if "extract" in args.cases:
+		def extract_all():
+			depsgraph = context.evaluated_depsgraph_get()
+			for obj in meshes:
+				batches.extract_mesh_arrays(obj, depsgraph)
+		results["extract"] = timed(extract_all, args.repeat)
+		results["extract"]["peak_mb"] = peak_memory(extract_all)
+
+	state = new_state(args)
+	if "create_batches" in args.cases:
+		results["create_batches"] = timed(lambda: batches.create_batches(context, state), args.repeat)
+		results["create_batches"]["peak_mb"] = peak_memory(lambda: batches.create_batches(context, state))
+		results["create_batches"]["batch_bytes"] = sum(d["nbytes"] for d in state["mesh_batches"].values())
+
+	if "update_specific_batches" in args.cases:
+		if not state["mesh_batches"]:
+			batches.create_batches(context, state)
+		sample = rng.sample(meshes, max(1, len(meshes) // 10))
+		changed = {obj.name for obj in sample}
+		# Drop the shared geometry as a geometry update would, so each run really rebuilds
+		sources = changed | {obj.data.name for obj in sample}
+
+		def update_specific():
+			batch_cache.invalidate_geometry(state, sources)
+			batches.update_specific_batches(context, changed, state)
+
+		builds = batch_cache.get_stats(state)["batch_builds"]
+		results["update_specific_batches"] = timed(update_specific, args.repeat)
+		results["update_specific_batches"]["batch_builds"] = batch_cache.get_stats(state)["batch_builds"] - builds
+		assert results["update_specific_batches"]["batch_builds"] > 0, "update_specific_batches built no batch"
+
+	if "depsgraph_update" in args.cases:
+		results["depsgraph_update"] = run_depsgraph_throughput(args, context, scene, meshes, batches, handlers, state, rng)
+
+	stages = profiler.summary()
+	profiler.set_enabled(False)
+
+	return {
+		"meta": {
+			"blender": bpy.app.version_string,
+			"background": bpy.app.background,
+			"gpu_upload": args.gpu,
+			"objects": args.objects,
+			"triangles": args.triangles,
+			"linked": args.linked,
+			"modifiers": args.modifiers,
+			"deforming": args.deforming,
+			"created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		},
+		"results": results,
+		"stages": stages,
+		"max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+	}
+
+def run_depsgraph_throughput(args, context, scene, meshes, batches, handlers, state, rng):
+	"""Drive transform, deformation and mesh edit updates and time the handler logic per update"""
+	import bpy
+
+	samples = []
+
+	def handler(_scene, depsgraph):
+		start = time.perf_counter()
+		handlers.process_depsgraph_update(context, handlers.depsgraph_trace.snapshot_updates(depsgraph.updates), state)
+		samples.append((time.perf_counter() - start) * 1000.0)
+
+	if not state["mesh_batches"]:
+		batches.create_batches(context, state)
+
+	stats = handlers.batch_cache.get_stats(state)
+	builds = stats["batch_builds"]
+	bpy.app.handlers.depsgraph_update_post.append(handler)
+	start = time.perf_counter()
+	try:
+		for step in range(args.steps):
+			if step % 3 == 0:
+				rng.choice(meshes).location.x += 0.1
+			elif step % 3 == 1:
+				scene.frame_set(scene.frame_current + 1)
+			else:
+				mesh = rng.choice(meshes).data
+				mesh.vertices[0].co.z += 0.01
+				mesh.update()
+			context.view_layer.update()
+	finally:
+		bpy.app.handlers.depsgraph_update_post.remove(handler)
+	total = (time.perf_counter() - start) * 1000.0
+	assert stats["batch_builds"] > builds or args.steps < 3, "depsgraph updates built no batch"
+
+	samples.sort()
+	return {
+		"median_ms": statistics.median(samples) if samples else 0.0,
+		"max_ms": samples[-1] if samples else 0.0,
+		"events": len(samples),
+		"updates_per_second": args.steps / (total / 1000.0) if total else 0.0,
+		"batch_builds": stats["batch_builds"] - builds,
+	}
+
+
+# --- Comparison ---
+def compare(current, baseline, threshold, min_delta_ms):
+	"""Return a list of (case, metric, baseline, current) regressions"""
+	regressions = []
+	for case, stats in current.get("results", {}).items():
+		base_stats = baseline.get("results", {}).get(case)
+		if not base_stats:
+			continue
+		for metric in ("median_ms", "peak_mb"):
+			if metric not in stats or metric not in base_stats:
+				continue
+			base, cur = base_stats[metric], stats[metric]
+			delta = cur - base
+			if metric.endswith("_ms") and delta < min_delta_ms:
+				continue
+			if base > 0 and delta / base > threshold:
+				regressions.append((case, metric, base, cur))
+	return regressions
+
+def print_results(data):
+	print(f"\n{'case':<26}{'median ms':>12}{'min ms':>12}{'peak MB':>10}")
+	for case, stats in data["results"].items():
+		print(f"{case:<26}{stats.get('median_ms', 0.0):>12.2f}{stats.get('min_ms', 0.0):>12.2f}{stats.get('peak_mb', 0.0):>10.2f}")
+
+	stages = data.get("stages", {})
+	if stages:
+		print(f"\n{'stage':<26}{'p50 ms':>12}{'p95 ms':>12}{'calls':>10}")
+		for name, stats in sorted(stages.items()):
+			print(f"{name:<26}{stats['p50_ms']:>12.3f}{stats['p95_ms']:>12.3f}{stats['calls']:>10}")
+
+def report_regressions(current, args):
+	with open(args.baseline, encoding="utf-8") as f:
+		baseline = json.load(f)
+
+	regressions = compare(current, baseline, args.threshold, args.min_delta_ms)
+	if not regressions:
+		print(f"\nNo regressions against {args.baseline} (threshold {args.threshold:.0%})")
+		return True
+
+	print(f"\nRegressions against {args.baseline}:")
+	for case, metric, base, cur in regressions:
+		print(f"  {case}.{metric}: {base:.2f} -> {cur:.2f} (+{(cur - base) / base:.0%})")
+	return False
+
+
+def main():
+	args = parse_args()
+
+	if args.compare:
+		if not args.baseline:
+			sys.exit("--compare requires --baseline")
+		with open(args.compare, encoding="utf-8") as f:
+			current = json.load(f)
+	else:
+		current = run_benchmarks(args)
+		if args.output:
+			with open(args.output, "w", encoding="utf-8") as f:
+				json.dump(current, f, indent=2)
+
+	print_results(current)
+
+	if args.baseline and not report_regressions(current, args):
+		sys.exit(1)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,60 @@
+import hashlib
+from collections import OrderedDict
+
+from mathutils.bvhtree import BVHTree
+
+from . import profiler
+
+#############################################################
+#
+# BVH Tree Cache
+# Object-space BVH trees keyed by a fingerprint of the mesh
+# arrays they were built from, so unchanged (and linked
+# duplicate) geometry is only built once.
+#
+#############################################################
+
+MAX_TREES = 512
+
+bvh_cache_state = {
+	"trees": OrderedDict(),  # fingerprint -> BVHTree, least recently used first
+	"hits": 0,
+	"misses": 0,
+}
+
+def geometry_fingerprint(positions, triangle_indices):
+	"""Content hash of vertex positions and triangle indices"""
+	digest = hashlib.blake2b(digest_size=16)
+	digest.update(positions.tobytes())
+	digest.update(triangle_indices.tobytes())
+	return digest.hexdigest()
+
+def get_tree(positions, triangle_indices, fingerprint=None):
+	"""
+	BVH tree of a triangle mesh given as (V, 3) positions and flat triangle indices.
+	Built on the first request for a fingerprint, a dictionary lookup afterwards.
+	"""
+
+	if fingerprint is None:
+		fingerprint = geometry_fingerprint(positions, triangle_indices)
+
+	trees = bvh_cache_state["trees"]
+	tree = trees.get(fingerprint)
+	if tree is not None:
+		trees.move_to_end(fingerprint)
+		bvh_cache_state["hits"] += 1
+		return tree
+
+	with profiler.stage("bvh_build"):
+		tree = BVHTree.FromPolygons(positions.tolist(), triangle_indices.reshape(-1, 3).tolist())
+
+	bvh_cache_state["misses"] += 1
+	trees[fingerprint] = tree
+	while len(trees) > MAX_TREES:
+		trees.popitem(last=False)
+	return tree
+
+def clear():
+	bvh_cache_state["trees"].clear()
+	bvh_cache_state["hits"] = 0
+	bvh_cache_state["misses"] = 0
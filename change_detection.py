@@ -0,0 +1,105 @@
+from . import batch_cache
+
+#############################################################
+#
+# Depsgraph Change Detection
+# Classifies snapshotted depsgraph updates (plain dicts, see
+# depsgraph_trace.snapshot_updates) into the minimal batch
+# work needed. No bpy access so it can be replayed offline.
+#
+#############################################################
+
+def new_plan():
+	return {
+		"recreate_all": False,  # rebuild every batch from scratch
+		"rebuild": set(),       # object names whose batch must be rebuilt
+		"evict": set(),         # object names whose batch must be dropped
+		"visible": None,        # new visible mesh set to cache, if it changed
+		"dirty": set(),         # object or mesh names whose shared geometry is stale
+		"dirty_all": False,     # geometry changed but couldn't be identified
+	}
+
+def geometry_changes(records):
+	"""
+	Names of objects and meshes with changed geometry.
+	Returns (names, recreate_all); recreate_all is set when an update can't be identified.
+	"""
+	changed = set()
+	for record in records:
+		if not record["geometry"] or record["type"] not in {'Mesh', 'Object'}:
+			continue
+		if record["name"] is None:
+			# Fallback to full recreation if we can't identify the object
+			return changed, True
+		changed.add(record["name"])
+	return changed, False
+
+def changed_objects(records, mesh_users):
+	"""
+	Names of objects with changed geometry: Object updates as is, Mesh updates mapped
+	to the objects using the mesh through `mesh_users` (mesh name -> object names).
+	"""
+	names = set()
+	for record in records:
+		if not record["geometry"]:
+			continue
+		if record["type"] == 'Object':
+			names.add(record["name"])
+		elif record["type"] == 'Mesh':
+			names.update(mesh_users.get(record["name"], ()))
+	return names
+
+def plan_update(records, cached_visible, cached_camera, get_visible, get_camera, get_mesh_users=dict):
+	"""
+	Decide what to rebuild after a depsgraph update.
+	`get_visible` and `get_camera` must return the current set of visible mesh object names
+	(in the overlay scope) and the active camera name; the camera is only checked when
+	nothing else changed. `get_mesh_users` returns the objects using each mesh, to map mesh
+	data edits to objects.
+	"""
+
+	plan = new_plan()
+
+	# 1. Geometry changes
+	changed, recreate_all = geometry_changes(records)
+	if recreate_all:
+		plan["recreate_all"] = True
+		plan["dirty_all"] = True
+		return plan
+	plan["dirty"] = set(changed)
+	if changed:
+		changed = changed_objects(records, get_mesh_users())
+
+	# 2. Visibility changes, also for changed objects: edits can move them out of the scope
+	current_visible = get_visible()
+	if current_visible != cached_visible:
+		plan["evict"] = cached_visible - current_visible
+		plan["visible"] = current_visible
+	changed = (changed & current_visible) | (current_visible - cached_visible)
+
+	# 3. Camera changes
+	if not changed:
+		current_camera = get_camera()
+		if current_camera != cached_camera:
+			plan["recreate_all"] = True
+			return plan
+
+	plan["rebuild"] = changed
+	return plan
+
+def process_update(state, records, get_visible, get_camera, rebuild_all, rebuild_some):
+	"""
+	Plan the work for snapshotted update `records` (see depsgraph_trace.snapshot_updates)
+	and apply it to the batch cache. Shared by the depsgraph handler and the offline
+	replay harness. Returns True if any batch changed.
+	"""
+
+	plan = plan_update(
+		records,
+		state.get("cached_visible_meshes", set()),
+		state.get("current_camera"),
+		get_visible,
+		get_camera,
+		lambda: batch_cache.mesh_users(state),
+	)
+	return batch_cache.apply_plan(state, plan, rebuild_all, rebuild_some)
@@ -0,0 +1,314 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import bpy
+import numpy as np
+
+from .batches import extract_indexed_mesh, geometry_key
+from .dof_math import solve_dof, circle_of_confusion, far_gradient_end
+from .properties import get_color_values
+from . import change_detection, depsgraph_trace, focus, profiler, ray_clusters
+
+#############################################################
+#
+# Offline CoC Map Rendering
+# CPU raycasting of the scene camera's view, tile by tile on
+# a thread pool, into clustered per-object meshes, producing
+# a float circle of confusion image and a colour-coded image
+# per frame. No GPU needed, so it runs headless on
+# render-farm nodes.
+#
+#############################################################
+
+coc_state = {
+	"meshes": {},  # geometry key -> {"mesh": clustered mesh, "source": name whose updates drop it, "frame": frame or None}
+	"hits": 0,
+	"misses": 0,
+}
+
+def camera_rays(scene, camera, width, height):
+	"""
+	World-space ray origins and unit directions for every pixel, shape (H * W, 3) each,
+	bottom row first (Blender image order).
+	"""
+
+	cam_data = camera.data
+	top_right, bottom_right, bottom_left, top_left = [np.array(corner) for corner in cam_data.view_frame(scene=scene)]
+
+	u = (np.arange(width) + 0.5) / width
+	v = (np.arange(height) + 0.5) / height
+	uu, vv = np.meshgrid(u, v)
+	points = (bottom_left
+		+ uu.reshape(-1, 1) * (bottom_right - bottom_left)
+		+ vv.reshape(-1, 1) * (top_left - bottom_left))
+
+	if cam_data.type == 'ORTHO':
+		origins = points * np.array((1.0, 1.0, 0.0))
+		directions = np.tile((0.0, 0.0, -1.0), (len(points), 1))
+	else:
+		origins = np.zeros_like(points)
+		directions = points
+
+	matrix = np.array(camera.matrix_world)
+	origins = origins @ matrix[:3, :3].T + matrix[:3, 3]
+	directions = directions @ matrix[:3, :3].T
+	directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+	return origins, directions
+
+def world_aabb(local_min, local_max, matrix):
+	"""Axis-aligned world bounds of a transformed object-space box"""
+	corners = np.array([
+		(x, y, z)
+		for x in (local_min[0], local_max[0])
+		for y in (local_min[1], local_max[1])
+		for z in (local_min[2], local_max[2])
+	])
+	world = corners @ matrix[:3, :3].T + matrix[:3, 3]
+	return world.min(axis=0), world.max(axis=0)
+
+def aabb_entry(origins, directions, box_min, box_max):
+	"""Vectorized slab test: distance along each ray to where it enters the box, inf if it misses"""
+	with np.errstate(divide='ignore', invalid='ignore'):
+		inverse = 1.0 / directions
+		t0 = (box_min - origins) * inverse
+		t1 = (box_max - origins) * inverse
+	t_near = np.maximum(np.nanmax(np.minimum(t0, t1), axis=1), 0.0)
+	t_far = np.nanmin(np.maximum(t0, t1), axis=1)
+	return np.where(t_far >= t_near, t_near, np.inf)
+
+def box_distance(location, box_min, box_max):
+	"""Distance from a point to a box, 0 inside"""
+	return float(np.linalg.norm(np.clip(location, box_min, box_max) - location))
+
+def get_mesh(obj, depsgraph, scene):
+	"""
+	Clustered evaluated mesh of `obj`, kept across frames and renders until a depsgraph
+	update changes its geometry. Meshes evaluated through modifiers or shape keys may
+	deform on any frame, and frame changes run no depsgraph_update_post, so those are
+	only reused on the frame they were built for.
+	"""
+
+	key, source = geometry_key(obj, scene.name)
+	frame = scene.frame_current if key[0] == 'OBJECT' else None
+	meshes = coc_state["meshes"]
+	entry = meshes.get(key)
+	if entry is not None and entry["frame"] == frame:
+		coc_state["hits"] += 1
+		return entry["mesh"]
+
+	indexed = extract_indexed_mesh(obj, depsgraph)
+	if indexed is None:
+		return None
+	positions, _, triangle_indices = indexed
+	with profiler.stage("build_clusters"):
+		mesh = ray_clusters.build_clusters(positions, triangle_indices.reshape(-1, 3))
+
+	coc_state["misses"] += 1
+	meshes[key] = {"mesh": mesh, "source": source, "frame": frame}
+	if on_depsgraph_update not in bpy.app.handlers.depsgraph_update_post:
+		bpy.app.handlers.depsgraph_update_post.append(on_depsgraph_update)
+	return mesh
+
+def invalidate_on_updates(records):
+	"""Drop the meshes whose object or mesh data changed geometry"""
+	changed, unknown = change_detection.geometry_changes(records)
+	if unknown:
+		coc_state["meshes"].clear()
+		return
+	meshes = coc_state["meshes"]
+	for key in [key for key, entry in meshes.items() if entry["source"] in changed]:
+		del meshes[key]
+
+def on_depsgraph_update(scene, depsgraph):
+	"""Registered while meshes are cached"""
+	invalidate_on_updates(depsgraph_trace.snapshot_updates(depsgraph.updates))
+
+def clear():
+	"""Drop all meshes and stop watching depsgraph updates (file load, unregister)"""
+	coc_state["meshes"].clear()
+	coc_state["hits"] = 0
+	coc_state["misses"] = 0
+	if on_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+		bpy.app.handlers.depsgraph_update_post.remove(on_depsgraph_update)
+
+def prepare_objects(context, depsgraph):
+	"""Fetch the (cached) clustered meshes of the visible meshes, with their world bounds"""
+
+	prepared = []
+	for obj in context.visible_objects:
+		if obj.type != 'MESH':
+			continue
+		mesh = get_mesh(obj, depsgraph, context.scene)
+		if mesh is None:
+			continue
+
+		matrix = np.array(obj.matrix_world)
+		box_min, box_max = world_aabb(*ray_clusters.bounds(mesh), matrix)
+		prepared.append({
+			"mesh": mesh,
+			"inverse": np.linalg.inv(matrix),
+			"aabb": (box_min, box_max),
+		})
+	return prepared
+
+def trace_tile(origins, directions, objects, view_z_row):
+	"""
+	Scene-camera depth of the closest hit for each ray of a tile (inf when nothing is hit).
+	`objects` should be sorted near to far: rays whose closest hit is before an object's
+	bounds skip that object entirely, and the others skip its clusters behind the hit.
+	"""
+
+	# World distance along each ray to its closest hit so far
+	closest = np.full(len(origins), np.inf)
+	for obj in objects:
+		candidates = np.flatnonzero(aabb_entry(origins, directions, *obj["aabb"]) < closest)
+		if not len(candidates):
+			continue
+
+		# Object-space rays keep world-unit distances: directions are transformed, not normalized
+		inverse = obj["inverse"]
+		local_origins = origins[candidates] @ inverse[:3, :3].T + inverse[:3, 3]
+		local_directions = directions[candidates] @ inverse[:3, :3].T
+		closest[candidates] = ray_clusters.cast(obj["mesh"], local_origins, local_directions, closest[candidates])
+
+	depths = np.full(len(origins), np.inf)
+	hit = np.isfinite(closest)
+	world_hits = origins[hit] + directions[hit] * closest[hit, None]
+	depths[hit] = -(world_hits @ view_z_row[:3] + view_z_row[3])
+	return depths
+
+def tiles(width, height, tile_size):
+	"""Flat pixel index arrays of each tile"""
+	for y in range(0, height, tile_size):
+		for x in range(0, width, tile_size):
+			ys = np.arange(y, min(y + tile_size, height))
+			xs = np.arange(x, min(x + tile_size, width))
+			yield (ys[:, None] * width + xs[None, :]).ravel()
+
+@profiler.profiled("render_coc_frame")
+def render_depth(context, camera, width, height, tile_size=32, workers=None):
+	"""Raycast the camera view into the clustered meshes and return the (H, W) depth image"""
+
+	scene = context.scene
+	depsgraph = context.evaluated_depsgraph_get()
+	location = np.array(camera.matrix_world.translation)
+	objects = sorted(prepare_objects(context, depsgraph), key=lambda obj: box_distance(location, *obj["aabb"]))
+
+	origins, directions = camera_rays(scene, camera, width, height)
+	view_z_row = np.array(camera.matrix_world.inverted())[2]
+
+	# Tracing is NumPy array work, which releases the GIL, so tiles run in parallel
+	depth = np.full(width * height, np.inf)
+	with ThreadPoolExecutor(max_workers=workers) as pool:
+		jobs = {
+			pool.submit(trace_tile, origins[pixels], directions[pixels], objects, view_z_row): pixels
+			for pixels in tiles(width, height, tile_size)
+		}
+		for job, pixels in jobs.items():
+			depth[pixels] = job.result()
+
+	return depth.reshape(height, width)
+
+def overlay_colors(depth, focal_length_m, fstop, sensor_width_m, focus_distance):
+	"""RGBA colours of the overlay gradient (as in fragment_shader, without lighting) for a depth image"""
+
+	dof_near, dof_far, _ = solve_dof(focal_length_m, fstop, sensor_width_m, focus_distance)
+	near_color, in_focus_color, far_color, far_max_color = (
+		np.array(get_color_values(name)) for name in ('near', 'in_focus', 'far', 'far_max')
+	)
+
+	def mix(a, b, t):
+		return a + (b - a) * t[..., None]
+
+	colors = np.zeros(depth.shape + (4,))
+	hit = np.isfinite(depth)
+
+	# Near field
+	near_mask = hit & (depth < dof_near)
+	if dof_near <= 0.0:
+		colors[near_mask] = near_color
+	else:
+		t = np.clip(depth[near_mask] / dof_near, 0.0, 1.0)
+		colors[near_mask] = mix(near_color, in_focus_color, t * t)
+
+	# In focus
+	colors[hit & (depth >= dof_near) & (depth <= dof_far)] = in_focus_color
+
+	# Far field
+	far_mask = hit & (depth > dof_far)
+	gradient_end = far_gradient_end(focal_length_m, fstop, sensor_width_m, focus_distance)
+	if dof_far >= gradient_end:
+		colors[far_mask] = far_max_color
+	else:
+		t = np.clip((depth[far_mask] - dof_far) / (gradient_end - dof_far), 0.0, 1.0)
+		colors[far_mask] = np.where(
+			(t < 0.8)[..., None],
+			mix(in_focus_color, far_color, np.minimum(t / 0.8, 1.0)),
+			mix(far_color, far_max_color, np.clip((t - 0.8) / 0.2, 0.0, 1.0)),
+		)
+
+	return colors
+
+def save_image(name, pixels, filepath, file_format, float_buffer):
+	"""Write an (H, W, 4) array through a temporary Blender image"""
+	height, width = pixels.shape[:2]
+	image = bpy.data.images.new(name, width, height, alpha=True, float_buffer=float_buffer)
+	try:
+		image.pixels.foreach_set(pixels.astype(np.float32).ravel())
+		image.filepath_raw = filepath
+		image.file_format = file_format
+		image.save()
+	finally:
+		bpy.data.images.remove(image)
+
+def render_frame(context, directory, resolution_scale=0.25, tile_size=32, workers=None):
+	"""
+	Render the CoC map of the current frame; returns the written file paths.
+	The EXR stores the raw CoC (RGB) and hit mask (A), the PNG the overlay colours.
+	"""
+
+	scene = context.scene
+	camera = scene.camera
+	cam_data = camera.data
+	width = max(1, int(scene.render.resolution_x * resolution_scale))
+	height = max(1, int(scene.render.resolution_y * resolution_scale))
+
+	depth = render_depth(context, camera, width, height, tile_size, workers)
+
+	focal_length_m = cam_data.lens / 1000.0
+	fstop = cam_data.dof.aperture_fstop
+	sensor_width_m = cam_data.sensor_width / 1000.0
+	depsgraph = context.evaluated_depsgraph_get()
+	focus_distance = focus.focus_distance(scene, camera.evaluated_get(depsgraph), depsgraph, cached=False)
+
+	hit = np.isfinite(depth)
+	coc = circle_of_confusion(np.where(hit, depth, 0.0), focal_length_m, fstop, focus_distance)
+
+	coc_pixels = np.zeros(depth.shape + (4,))
+	coc_pixels[..., :3] = coc[..., None]
+	coc_pixels[..., 3] = hit
+
+	frame = scene.frame_current
+	coc_path = os.path.join(directory, f"coc_{frame:04d}.exr")
+	color_path = os.path.join(directory, f"coc_{frame:04d}.png")
+	save_image("DoF CoC", coc_pixels, coc_path, 'OPEN_EXR', True)
+	save_image("DoF CoC Colors", overlay_colors(depth, focal_length_m, fstop, sensor_width_m, focus_distance), color_path, 'PNG', False)
+	return coc_path, color_path
+
+def render_frames(context, state, frames, directory, resolution_scale=0.25, tile_size=32, workers=None):
+	"""Render CoC maps for each frame, restoring the current frame afterwards"""
+
+	scene = context.scene
+	original_frame = scene.frame_current
+	os.makedirs(directory, exist_ok=True)
+
+	written = []
+	state["suspend_updates"] = True
+	try:
+		for frame in frames:
+			scene.frame_set(int(frame))
+			written.extend(render_frame(context, directory, resolution_scale, tile_size, workers))
+	finally:
+		scene.frame_set(original_frame)
+		state["suspend_updates"] = False
+	return written
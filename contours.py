@@ -0,0 +1,268 @@
+from collections import OrderedDict
+
+import bpy
+import gpu
+import numpy as np
+from gpu_extras.batch import batch_for_shader
+
+from .properties import get_color_values
+from . import profiler
+
+#############################################################
+#
+# Exact DoF Contours
+# Intersection lines of the focal and DoF limit planes with
+# the cached mesh triangles, computed in object space with
+# NumPy and cached per object until the geometry or the
+# plane (as seen from that object) changes.
+#
+#############################################################
+
+# Object-space planes cached per object (current near/focus/far plus a few previous ones)
+MAX_PLANES_PER_OBJECT = 6
+
+# Decimals of the object-space plane used as cache key
+PLANE_KEY_DECIMALS = 6
+
+contour_state = {
+	"objects": {},  # object name -> {"version": batch version, "planes": OrderedDict(plane key -> contour)}
+}
+
+# Triangle edges as corner pairs
+_EDGES = np.array(((0, 1), (1, 2), (2, 0)))
+
+def camera_planes(camera, info_data, show_focal_plane, show_dof_limits):
+	"""
+	World-space planes to contour as (color type, normal, offset) with normal . x = offset.
+	Depth is measured along the scene camera's view axis, like in the overlay shader.
+	"""
+
+	matrix = np.array(camera.matrix_world)
+	forward = -matrix[:3, 2]
+	forward /= np.linalg.norm(forward)
+	origin_offset = float(forward @ matrix[:3, 3])
+
+	depths = []
+	if show_focal_plane:
+		depths.append(('focal_plane', info_data.get("focus_distance", 0.0)))
+	if show_dof_limits:
+		depths.append(('near', info_data.get("dof_near", 0.0)))
+		depths.append(('far_max', info_data.get("dof_far", float('inf'))))
+
+	return [
+		(color_type, forward, depth + origin_offset)
+		for color_type, depth in depths
+		if np.isfinite(depth) and depth > 0.0
+	]
+
+def plane_to_object_space(normal, offset, matrix):
+	"""Express a world-space plane in the object space of `matrix` (4x4), with a unit normal"""
+	rotation = matrix[:3, :3]
+	local_normal = rotation.T @ normal
+	local_offset = offset - float(normal @ matrix[:3, 3])
+	length = np.linalg.norm(local_normal)
+	if length == 0.0:
+		return None
+	return local_normal / length, local_offset / length
+
+def plane_key(normal, offset):
+	return tuple(np.round(np.append(normal, offset), PLANE_KEY_DECIMALS).tolist())
+
+def plane_segments(positions, triangles, normal, offset):
+	"""
+	Intersect a plane with a triangle mesh, vectorized over all triangles.
+	Returns (K, 2, 3) segment end points and (K, 2) mesh edge keys of those points,
+	so segments sharing an edge can be chained into polylines.
+	"""
+
+	distances = positions @ normal - offset
+	above = distances[triangles] >= 0.0
+
+	# Triangles with corners on both sides of the plane cross it on exactly two edges
+	crossing = above.any(axis=1) & ~above.all(axis=1)
+	triangles = triangles[crossing]
+	if not len(triangles):
+		return np.empty((0, 2, 3), dtype=np.float32), np.empty((0, 2), dtype=np.int64)
+
+	starts = triangles[:, _EDGES[:, 0]]
+	ends = triangles[:, _EDGES[:, 1]]
+	edge_crossing = above[crossing][:, _EDGES[:, 0]] != above[crossing][:, _EDGES[:, 1]]
+	starts = starts[edge_crossing].reshape(-1, 2)
+	ends = ends[edge_crossing].reshape(-1, 2)
+
+	d_start = distances[starts]
+	d_end = distances[ends]
+	t = (d_start / (d_start - d_end))[..., None]
+	points = positions[starts] + t * (positions[ends] - positions[starts])
+
+	count = np.int64(len(positions))
+	keys = np.minimum(starts, ends).astype(np.int64) * count + np.maximum(starts, ends)
+	return points.astype(np.float32), keys
+
+def chain_segments(points, keys):
+	"""Chain segments that share mesh edges into polylines, returned as lists of points"""
+
+	by_key = {}
+	for index, (key_a, key_b) in enumerate(keys.tolist()):
+		by_key.setdefault(key_a, []).append(index)
+		by_key.setdefault(key_b, []).append(index)
+
+	used = np.zeros(len(points), dtype=bool)
+	polylines = []
+
+	def walk(key, line):
+		# Follow segments through the edge `key` until the contour closes or hits a boundary
+		while True:
+			following = [other for other in by_key[key] if not used[other]]
+			if not following:
+				return
+			index = following[0]
+			used[index] = True
+			side = 0 if keys[index, 0] == key else 1
+			line.append(points[index, 1 - side])
+			key = keys[index, 1 - side]
+
+	for index in range(len(points)):
+		if used[index]:
+			continue
+		used[index] = True
+		forward = [points[index, 0], points[index, 1]]
+		walk(keys[index, 1], forward)
+		backward = []
+		walk(keys[index, 0], backward)
+		polylines.append(backward[::-1] + forward)
+	return polylines
+
+def get_object_contours(name, data, planes, matrix):
+	"""
+	Object-space contours of the cached batch `data` for each world-space plane.
+	Recomputes a plane only when the batch was rebuilt or the plane moved relative to the object.
+	"""
+
+	cached = contour_state["objects"].get(name)
+	if cached is None or cached["version"] != data.get("version"):
+		cached = {"version": data.get("version"), "planes": OrderedDict()}
+		contour_state["objects"][name] = cached
+
+	contours = []
+	for color_type, normal, offset in planes:
+		local_plane = plane_to_object_space(normal, offset, matrix)
+		if local_plane is None:
+			continue
+
+		key = plane_key(*local_plane)
+		contour = cached["planes"].get(key)
+		if contour is None:
+			with profiler.stage("contours"):
+				points, keys = plane_segments(data["positions"], data["triangles"], *local_plane)
+			contour = {"points": points, "keys": keys, "batch": None}
+			cached["planes"][key] = contour
+			while len(cached["planes"]) > MAX_PLANES_PER_OBJECT:
+				cached["planes"].popitem(last=False)
+		else:
+			cached["planes"].move_to_end(key)
+		contours.append((color_type, contour))
+	return contours
+
+def prune(mesh_batches):
+	"""Drop contours of objects whose batches were evicted"""
+	for name in list(contour_state["objects"]):
+		if name not in mesh_batches:
+			del contour_state["objects"][name]
+
+def clear():
+	contour_state["objects"].clear()
+
+def depth_biased_projection(projection_matrix):
+	"""
+	Projection pulled slightly towards the viewer so lines on surfaces win the depth test.
+	The gpu module has no polygon offset, so the depth term of the matrix is biased instead:
+	perspective NDC depth is -A + B / d at view distance d, and scaling B moves lines
+	0.05% of their distance closer, tracking the depth buffer's precision; orthographic
+	NDC depth is linear, and shifting B moves lines a constant 0.025% of the clip range
+	closer. x, y and w are untouched, so the lines stay in place on screen.
+	"""
+	projection = projection_matrix.copy()
+	if projection[3][3] == 0.0:
+		projection[2][3] *= 1.0005
+	else:
+		projection[2][3] -= 0.0005
+	return projection
+
+@profiler.profiled("draw_contours")
+def draw_contours(context, objects, planes, line_width=2.0):
+	"""Draw exact contours of `objects` (pairs of object and batch data) as polylines"""
+
+	region = context.region
+	shader = gpu.shader.from_builtin('POLYLINE_UNIFORM_COLOR')
+	shader.bind()
+	shader.uniform_float("viewportSize", (region.width, region.height))
+	shader.uniform_float("lineWidth", line_width * context.preferences.view.ui_scale)
+
+	with gpu.matrix.push_pop_projection():
+		gpu.matrix.load_projection_matrix(depth_biased_projection(context.space_data.region_3d.window_matrix))
+		for obj, data in objects:
+			if data.get("positions") is None:
+				continue
+			matrix = np.array(obj.matrix_world)
+			contours = get_object_contours(obj.name, data, planes, matrix)
+			with gpu.matrix.push_pop():
+				gpu.matrix.multiply_matrix(obj.matrix_world)
+				for color_type, contour in contours:
+					if not len(contour["points"]):
+						continue
+					if contour["batch"] is None:
+						contour["batch"] = batch_for_shader(shader, 'LINES', {"pos": contour["points"].reshape(-1, 3)})
+					shader.uniform_float("color", get_color_values(color_type))
+					contour["batch"].draw(shader)
+
+# --- Curve Export ---
+CONTOUR_NAMES = {
+	'focal_plane': "Focal Plane",
+	'near': "DoF Near",
+	'far_max': "DoF Far",
+}
+
+def create_curves(context, objects, planes, collection_name="DoF Contours"):
+	"""
+	Create one poly curve object per plane with the world-space contours of `objects`.
+	Returns the created curve objects.
+	"""
+
+	collection = bpy.data.collections.get(collection_name)
+	if collection is None:
+		collection = bpy.data.collections.new(collection_name)
+		context.scene.collection.children.link(collection)
+
+	polylines = {color_type: [] for color_type, _, _ in planes}
+	for obj, data in objects:
+		if data.get("positions") is None:
+			continue
+		matrix = np.array(obj.matrix_world)
+		for color_type, contour in get_object_contours(obj.name, data, planes, matrix):
+			for line in chain_segments(contour["points"], contour["keys"]):
+				line = np.array(line, dtype=np.float64)
+				polylines[color_type].append(line @ matrix[:3, :3].T + matrix[:3, 3])
+
+	created = []
+	for color_type, lines in polylines.items():
+		if not lines:
+			continue
+		name = CONTOUR_NAMES[color_type]
+		curve = bpy.data.curves.new(name, 'CURVE')
+		curve.dimensions = '3D'
+		for line in lines:
+			closed = len(line) > 2 and np.allclose(line[0], line[-1])
+			if closed:
+				line = line[:-1]
+			spline = curve.splines.new('POLY')
+			spline.points.add(len(line) - 1)
+			coords = np.ones((len(line), 4))
+			coords[:, :3] = line
+			spline.points.foreach_set("co", coords.ravel())
+			spline.use_cyclic_u = closed
+
+		curve_object = bpy.data.objects.new(name, curve)
+		collection.objects.link(curve_object)
+		created.append(curve_object)
+	return created
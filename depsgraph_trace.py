@@ -0,0 +1,108 @@
+import json
+import time
+
+#############################################################
+#
+# Depsgraph Trace Recording
+# Snapshots depsgraph updates into plain records (no bpy) and
+# optionally streams them to a JSON-lines file for replay
+# outside Blender (see tools/replay_trace.py).
+#
+#############################################################
+
+TRACE_VERSION = 1
+
+recorder_state = {
+	"file": None,
+	"path": None,
+	"events": 0,
+	"start": 0.0,
+	"visible": set(),  # last visible set written, traces only store deltas
+	"camera": None,
+}
+
+# --- Snapshots ---
+def snapshot_update(update):
+	"""Convert a depsgraph update (or a stand-in with the same attributes) to a plain dict"""
+	update_id = getattr(update, "id", None)
+	id_type = update_id.bl_rna.identifier if update_id is not None else None
+	return {
+		"type": id_type,
+		"name": getattr(update_id, "name", None),
+		"geometry": bool(update.is_updated_geometry),
+		"transform": bool(update.is_updated_transform),
+		"shading": bool(update.is_updated_shading),
+	}
+
+def snapshot_updates(updates):
+	return [snapshot_update(update) for update in updates]
+
+# --- Recording ---
+def is_recording():
+	return recorder_state["file"] is not None
+
+def start_recording(filepath):
+	"""Open a trace file; subsequent handler calls append one event each"""
+	stop_recording()
+	recorder_state["file"] = open(filepath, "w", encoding="utf-8")
+	recorder_state["path"] = filepath
+	recorder_state["events"] = 0
+	recorder_state["start"] = time.perf_counter()
+	recorder_state["visible"] = set()
+	recorder_state["camera"] = None
+
+	header = {"trace_version": TRACE_VERSION, "created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+	recorder_state["file"].write(json.dumps(header) + "\n")
+
+def stop_recording():
+	"""Close the current trace file, returning its path and event count"""
+	trace_file = recorder_state["file"]
+	if trace_file is None:
+		return None, 0
+
+	trace_file.close()
+	recorder_state["file"] = None
+	return recorder_state["path"], recorder_state["events"]
+
+def record_event(records, visible_meshes, camera_name, duration):
+	"""Append one handler invocation: update records, visibility delta, camera and handler time"""
+	trace_file = recorder_state["file"]
+	if trace_file is None:
+		return
+
+	previous = recorder_state["visible"]
+	event = {
+		"t": time.perf_counter() - recorder_state["start"],
+		"updates": records,
+		"duration_ms": duration * 1000.0,
+	}
+	if visible_meshes != previous:
+		event["visible_added"] = sorted(visible_meshes - previous)
+		event["visible_removed"] = sorted(previous - visible_meshes)
+		recorder_state["visible"] = set(visible_meshes)
+	if camera_name != recorder_state["camera"]:
+		event["camera"] = camera_name
+		recorder_state["camera"] = camera_name
+
+	trace_file.write(json.dumps(event) + "\n")
+	recorder_state["events"] += 1
+
+# --- Loading ---
+def load_trace(filepath):
+	"""Yield events with the full visible set and camera name reconstructed"""
+	visible = set()
+	camera = None
+	with open(filepath, encoding="utf-8") as f:
+		header = json.loads(f.readline())
+		if header.get("trace_version") != TRACE_VERSION:
+			raise ValueError(f"Unsupported trace version: {header.get('trace_version')}")
+
+		for line in f:
+			if not line.strip():
+				continue
+			event = json.loads(line)
+			visible = (visible - set(event.get("visible_removed", ()))) | set(event.get("visible_added", ()))
+			camera = event.get("camera", camera)
+			event["visible"] = visible
+			event["camera"] = camera
+			yield event
@@ -0,0 +1,104 @@
+from functools import lru_cache
+
+import numpy as np
+
+#############################################################
+#
+# Depth of Field Math
+# Pure functions (no bpy, NumPy only) solving the thin-lens DoF model
+# used by the overlay and the shaders.
+#
+#############################################################
+
+# Acceptable circle of confusion as a fraction of the sensor width
+COC_DIVISOR = 1500.0
+
+@lru_cache(maxsize=1024)
+def solve_dof(focal_length_m, fstop, sensor_width_m, focus_distance):
+	"""
+	Solve near/far DoF limits and the hyperfocal distance (all in meters).
+	Returns (dof_near, dof_far, hyperfocal); far and hyperfocal are inf when unbounded.
+	Memoized since the camera state rarely changes between redraws.
+	"""
+
+	dof_near, dof_far, hyperfocal = 0.0, float('inf'), float('inf')
+
+	if fstop > 0 and focus_distance > 0:
+		coc = sensor_width_m / COC_DIVISOR
+		hyperfocal = (focal_length_m**2) / (fstop * coc) + focal_length_m
+
+		s_minus_f = focus_distance - focal_length_m
+		if s_minus_f > 0:
+			if focus_distance >= hyperfocal:
+				dof_far = float('inf')
+			else:
+				dof_far = (hyperfocal * focus_distance) / (hyperfocal - s_minus_f)
+
+			dof_near = (hyperfocal * focus_distance) / (hyperfocal + s_minus_f)
+
+	return dof_near, dof_far, hyperfocal
+
+def dof_info(focal_length_m, fstop, sensor_width_m, focus_distance):
+	"""DoF solve packed in the dict layout stored in dof_viz_state["info_data"]"""
+	dof_near, dof_far, hyperfocal = solve_dof(focal_length_m, fstop, sensor_width_m, focus_distance)
+	return {
+		"focus_distance": focus_distance,
+		"dof_near": dof_near,
+		"dof_far": dof_far,
+		"hyperfocal": hyperfocal,
+	}
+
+def solve_dof_arrays(focal_length_m, fstop, sensor_width_m, focus_distance):
+	"""
+	Vectorized solve_dof over NumPy arrays (one element per sample, e.g. per frame).
+	Returns (dof_near, dof_far, hyperfocal) arrays with the same conventions as solve_dof.
+	"""
+
+	focal_length_m, fstop, sensor_width_m, focus_distance = np.broadcast_arrays(
+		*(np.asarray(value, dtype=np.float64) for value in (focal_length_m, fstop, sensor_width_m, focus_distance))
+	)
+
+	dof_near = np.zeros(focus_distance.shape)
+	dof_far = np.full(focus_distance.shape, np.inf)
+	hyperfocal = np.full(focus_distance.shape, np.inf)
+
+	valid = (fstop > 0) & (focus_distance > 0) & (sensor_width_m > 0)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		coc = sensor_width_m / COC_DIVISOR
+		hyperfocal = np.where(valid, (focal_length_m**2) / (fstop * coc) + focal_length_m, hyperfocal)
+
+		s_minus_f = focus_distance - focal_length_m
+		bounded = valid & (s_minus_f > 0)
+		finite_far = bounded & (focus_distance < hyperfocal)
+
+		dof_far = np.where(finite_far, (hyperfocal * focus_distance) / (hyperfocal - s_minus_f), dof_far)
+		dof_near = np.where(bounded, (hyperfocal * focus_distance) / (hyperfocal + s_minus_f), dof_near)
+
+	return dof_near, dof_far, hyperfocal
+
+def circle_of_confusion(depth, focal_length_m, fstop, focus_distance):
+	"""
+	Circle of confusion at each depth using the fragment shader's formula:
+	c = (f² / (N * (S₁ - f))) * |1/S₁ - 1/S₂|, zero where undefined.
+	"""
+
+	depth = np.asarray(depth, dtype=np.float64)
+	if fstop <= 0 or focus_distance <= focal_length_m:
+		return np.zeros(depth.shape)
+
+	scale = (focal_length_m * focal_length_m) / (fstop * (focus_distance - focal_length_m))
+	with np.errstate(divide='ignore', invalid='ignore'):
+		coc = scale * np.abs(1.0 / focus_distance - 1.0 / depth)
+	return np.where(depth > 0, coc, 0.0)
+
+def far_gradient_end(focal_length_m, fstop, sensor_width_m, focus_distance):
+	"""Distance where the far blur reaches the acceptable CoC, as solved in the fragment shader"""
+
+	if focus_distance <= 0.0 or focal_length_m <= 0.0:
+		return focus_distance * 10.0
+
+	standard_coc = sensor_width_m / COC_DIVISOR
+	term = (standard_coc * fstop * (focus_distance - focal_length_m)) / (focal_length_m * focal_length_m)
+	if term >= 1.0 / focus_distance:
+		return focus_distance * 10.0
+	return 1.0 / (1.0 / focus_distance - term)
@@ -0,0 +1,160 @@
+import itertools
+
+from mathutils import Vector
+
+from .batches import extract_indexed_mesh
+from . import bvh_cache, change_detection, profiler
+
+#############################################################
+#
+# Focus Distance
+# Distance from the scene camera to its focus object, either
+# origin to origin (Blender's behaviour) or to the object's
+# surface along the view axis or through a screen point,
+# raycast into a BVH tree cached per evaluated mesh.
+#
+#############################################################
+
+focus_state = {
+	"trees": {},       # object name -> {"tree", "data": mesh name, "frame", "version"}, dropped when the mesh changes
+	"last": (None, 0.0),  # (query key, distance) of the latest surface query
+	"fallback": None,  # focus object whose surface the latest viewport query missed
+}
+
+# Versions of the cached trees, identifying them in the surface query key
+_versions = itertools.count(1)
+
+def get_settings(scene):
+	"""Scene focus settings, or None when the add-on isn't registered (e.g. benchmarks)"""
+	return getattr(scene, "dof_viz_focus", None)
+
+def settings_key(scene):
+	"""Hashable summary of the settings affecting the focus distance"""
+	settings = get_settings(scene)
+	if settings is None:
+		return ('ORIGIN',)
+	return (settings.mode, tuple(settings.screen_point))
+
+def screen_ray(scene, camera, point):
+	"""Camera-space origin and direction of the ray through `point` (0-1 in the camera frame)"""
+	top_right, bottom_right, bottom_left, top_left = [Vector(corner) for corner in camera.data.view_frame(scene=scene)]
+	target = bottom_left + (bottom_right - bottom_left) * point[0] + (top_left - bottom_left) * point[1]
+	if camera.data.type == 'ORTHO':
+		return Vector((target.x, target.y, 0.0)), Vector((0.0, 0.0, -1.0))
+	return Vector((0.0, 0.0, 0.0)), target.normalized()
+
+def object_tree(obj, depsgraph, frame, cached=True):
+	"""
+	BVH tree of the evaluated mesh of `obj` and its version (None when not cached). With
+	`cached`, reuses the tree kept for the object until the depsgraph handler reports a change
+	of its mesh; meshes evaluated through modifiers or shape keys may deform on any frame, and
+	frame changes run no depsgraph_update_post, so their trees are kept for `frame` only.
+	Without `cached`, looks the tree up by content.
+	"""
+
+	original = obj.original
+	frame = frame if original.modifiers or original.data.shape_keys is not None else None
+	entry = focus_state["trees"].get(obj.name) if cached else None
+	if entry is not None and entry["frame"] == frame:
+		return entry["tree"], entry["version"]
+
+	indexed = extract_indexed_mesh(obj, depsgraph)
+	if indexed is None:
+		return None, None
+	positions, _, triangle_indices = indexed
+	tree = bvh_cache.get_tree(positions, triangle_indices)
+	if not cached:
+		return tree, None
+
+	version = next(_versions)
+	focus_state["trees"][obj.name] = {"tree": tree, "data": original.data.name, "frame": frame, "version": version}
+	return tree, version
+
+def surface_depth(scene, camera, focus_object, depsgraph, point=None, cached=True):
+	"""
+	Scene-camera depth of the first hit of a camera ray with the focus object's surface,
+	along the view axis or through the screen `point`. None when the ray misses.
+	"""
+
+	tree, version = object_tree(focus_object, depsgraph, scene.frame_current_final, cached)
+	if tree is None:
+		return None
+
+	camera_matrix = camera.matrix_world
+	object_matrix = focus_object.matrix_world
+	if point is None:
+		origin, direction = Vector((0.0, 0.0, 0.0)), Vector((0.0, 0.0, -1.0))
+	else:
+		origin, direction = screen_ray(scene, camera, point)
+	world_origin = camera_matrix @ origin
+	world_direction = camera_matrix.to_3x3() @ direction
+
+	# Same ray, object transform and tree as the previous redraw: reuse the distance
+	key = (version, tuple(world_origin), tuple(world_direction), tuple(map(tuple, object_matrix)))
+	if cached and focus_state["last"][0] == key:
+		return focus_state["last"][1]
+
+	with profiler.stage("focus_raycast"):
+		to_local = object_matrix.inverted()
+		location, _, _, _ = tree.ray_cast(to_local @ world_origin, to_local.to_3x3() @ world_direction)
+
+	depth = None
+	if location is not None:
+		# Depth along the view axis, as used by the overlay shader
+		depth = -(camera_matrix.inverted() @ (object_matrix @ location)).z
+
+	if cached:
+		focus_state["last"] = (key, depth)
+	return depth
+
+def focus_distance(scene, camera, depsgraph=None, cached=True):
+	"""
+	Focus distance of `camera` according to the scene focus settings. `camera` should be
+	evaluated (the focus object is evaluated here). Surface modes fall back to the origin
+	distance when the object has no mesh or the ray misses it; cached (viewport) queries
+	record that object in focus_state["fallback"] so the overlay can say so.
+	"""
+
+	cam_data = camera.data
+	focus_object = cam_data.dof.focus_object
+	if not focus_object:
+		if cached:
+			focus_state["fallback"] = None
+		return cam_data.dof.focus_distance
+
+	if depsgraph is not None:
+		focus_object = focus_object.evaluated_get(depsgraph)
+	origin_distance = (camera.matrix_world.translation - focus_object.matrix_world.translation).length
+
+	settings = get_settings(scene)
+	surface = settings is not None and settings.mode != 'ORIGIN' and depsgraph is not None
+	depth = None
+	if surface and focus_object.type == 'MESH':
+		point = tuple(settings.screen_point) if settings.mode == 'SCREEN_POINT' else None
+		depth = surface_depth(scene, camera, focus_object, depsgraph, point, cached)
+
+	if cached:
+		focus_state["fallback"] = focus_object.name if surface and depth is None else None
+	return origin_distance if depth is None else depth
+
+def invalidate_on_updates(records):
+	"""Drop cached trees of focus objects whose mesh changed in a depsgraph update"""
+
+	trees = focus_state["trees"]
+	if not trees:
+		return
+
+	changed, unknown = change_detection.geometry_changes(records)
+	if unknown:
+		clear()
+		return
+
+	for name, entry in list(trees.items()):
+		if name in changed or entry["data"] in changed:
+			del trees[name]
+			focus_state["last"] = (None, 0.0)
+
+def clear():
+	focus_state["trees"].clear()
+	focus_state["last"] = (None, 0.0)
+	focus_state["fallback"] = None
@@ -3,52 +3,35 @@ import gpu
 import blf
 from mathutils import Vector
 
-from .batches import create_batches, update_specific_batches, create_single_batch
+from .batches import create_batches, create_batches_sliced, update_specific_batches, create_single_batch, drop_contour_geometry
 from .shaders import vertex_shader, fragment_shader
-from .properties import get_area_index, get_area_dof_setting, get_color_values
+from .properties import get_area_dof_setting, find_area_settings, anchor_area_settings, any_area_enabled, shown_screens, get_color_values, AREA_SETTINGS
+from . import profiler, batch_cache, bvh_cache, change_detection, contours, scope, depsgraph_trace, dof_math, focus, timeline
 
 import time
 
-def timeit(func):
-	def wrapper(*args, **kwargs):
-		start = time.perf_counter()
-		result = func(*args, **kwargs)
-		end = time.perf_counter()
-		print(f"{func.__name__} took {end - start:.6f} seconds")
-		return result
-	return wrapper
-
 # --- Global State ---
 dof_viz_state = {
-	"area_handlers": {},  # area_index -> {"draw_handler": handler, "text_handler": handler}
+	"area_handlers": {},  # area.as_pointer() -> {"draw_handler": handler, "text_handler": handler}
 	"depsgraph_handler": None,
 	"shader": None,
 	"mesh_batches": {},
+	"cache_stats": batch_cache.new_stats(),
+	"timeline": None,  # Precomputed DoF values over the frame range
+	"prewarm": None,  # Generator of the time-sliced batch build started on file load
+	"contour_geometry": False,  # Whether batches keep indexed geometry for the exact contour lines
 	"info_data": {}  # Store calculated values for text display
 }
 
 def is_any_area_enabled():
-	"""Check if any area has DoF visualization enabled"""
-	for window in bpy.context.window_manager.windows:
-		for area_index, area in enumerate(window.screen.areas):
-			if area.type == 'VIEW_3D':
-				# Check if any setting is enabled for this area
-				if (get_area_dof_setting_by_index(area_index, "show_depth_of_field") or
-					get_area_dof_setting_by_index(area_index, "show_focal_plane") or
-					get_area_dof_setting_by_index(area_index, "show_dof_limits") or
-					get_area_dof_setting_by_index(area_index, "show_text_info")):
-					return True
-	return False
-
-def get_area_dof_setting_by_index(area_index, prop_name, default=False):
-	"""Get DoF setting by area index"""
-	if area_index == -1:
-		return default
-
-	from .properties import get_area_property_name
-	prop_name = get_area_property_name(area_index, prop_name)
-	return getattr(bpy.context.window_manager, prop_name, default)
+	"""Check if any area of a screen shown in a window has DoF visualization enabled"""
+	return any_area_enabled(shown_screens())
+
+def is_target_area(context, target_area):
+	"""Whether a draw callback runs in the area its handler was registered for"""
+	return context.area is not None and context.area.as_pointer() == target_area
 
+@profiler.profiled("on_depsgraph_update")
 def on_depsgraph_update(scene, depsgraph):
 	"""
 	Handler called when Blender's dependency graph updates (objects move, geometry changes, etc.).
@@ -56,61 +39,129 @@ def on_depsgraph_update(scene, depsgraph):
 	batches for objects that actually changed geometry or visibility.
 	"""
 
-	if not dof_viz_state["area_handlers"] or not is_any_area_enabled():
+	if not dof_viz_state["area_handlers"] or dof_viz_state.get("suspend_updates"):
+		return
+
+	start = time.perf_counter()
+	records = depsgraph_trace.snapshot_updates(depsgraph.updates)
+	key = batch_cache.scene_key(depsgraph.scene, depsgraph.view_layer)
+	current = key == batch_cache.scene_key(bpy.context.scene, bpy.context.view_layer)
+	if current and is_any_area_enabled():
+		batch_cache.select_scene(dof_viz_state, key)
+		process_depsgraph_update(bpy.context, records, dof_viz_state)
+
+		if depsgraph_trace.is_recording():
+			depsgraph_trace.record_event(
+				records,
+				get_visible_mesh_names(bpy.context, dof_viz_state, ()),
+				get_camera_name(bpy.context),
+				time.perf_counter() - start,
+			)
+	else:
+		# Another window's scene, or overlays only on screens no window shows:
+		# drop what changed, the missing batches are built when drawn
+		process_background_update(records, dof_viz_state, key)
+	if current:
+		timeline.invalidate_on_updates(dof_viz_state, records, bpy.context.scene)
+	focus.invalidate_on_updates(records)
+	batch_cache.prune_scenes(dof_viz_state, existing_scene_keys())
+
+	# Tag the viewports showing the updated scene or one of the updated objects
+	tag_redraw_areas(depsgraph.scene, {record["name"] for record in records if record["type"] == 'Object'})
+
+def process_background_update(records, state, key):
+	"""
+	Handle an update of a scene shown in another window than the current context's.
+	Its batches can't be rebuilt without that window's context, so changed ones are dropped
+	from its cache (left unselected) and the scene is marked incomplete; its next redraw
+	builds the missing batches.
+	"""
+
+	stats = batch_cache.get_stats(state)
+	stats["updates"] += 1
+	cache = batch_cache.scene_cache(state, key)
+	changed, unknown = change_detection.geometry_changes(records)
+	if unknown:
+		batch_cache.invalidate_geometry(state)
+		if cache is not None:
+			cache["mesh_batches"].clear()
+	elif changed:
+		batch_cache.invalidate_geometry(state, changed)
+		if cache is not None:
+			batch_cache.evict_batches(state, change_detection.changed_objects(records, batch_cache.mesh_users(cache)), cache)
+	elif cache is None or not any(record["type"] == 'Object' for record in records):
+		stats["idle_updates"] += 1
 		return
 
-	# Track what actually changed to minimize work
-	geometry_changed_objects = set()
-	recreate_batches = False
-
-	# 1. More granular geometry change detection
-	for update in depsgraph.updates:
-		if update.is_updated_geometry and hasattr(update, 'id') and update.id.bl_rna.identifier == 'Mesh':
-			if hasattr(update.id, 'name'):
-				geometry_changed_objects.add(update.id.name)
-			else:
-				# Fallback to full recreation if we can't identify the object
-				recreate_batches = True
-				break
-
-	# 2. Check for object visibility or transform changes (cheaper than full recreation)
-	if not recreate_batches and not geometry_changed_objects:
-		current_visible_meshes = {obj.name for obj in bpy.context.visible_objects if obj.type == 'MESH'}
-		cached_visible_meshes = dof_viz_state.get("cached_visible_meshes", set())
-
-		if current_visible_meshes != cached_visible_meshes:
-			# Only recreate batches for objects that changed visibility
-			removed_objects = cached_visible_meshes - current_visible_meshes
-			new_objects = current_visible_meshes - cached_visible_meshes
-			
-			if removed_objects:
-				for obj_name in removed_objects:
-					dof_viz_state["mesh_batches"].pop(obj_name, None)
-			
-			if new_objects:
-				geometry_changed_objects.update(new_objects)
-			
-			dof_viz_state["cached_visible_meshes"] = current_visible_meshes
-
-	# 3. Camera change detection (unchanged)
-	if not recreate_batches and not geometry_changed_objects:
-		current_active_camera = bpy.context.scene.camera
-		if dof_viz_state.get("current_camera") != current_active_camera:
-			recreate_batches = True
-
-	# 4. Perform targeted updates
-	if recreate_batches:
-		create_batches(bpy.context, dof_viz_state)
-		dof_viz_state["current_camera"] = bpy.context.scene.camera
-	elif geometry_changed_objects:
-		update_specific_batches(bpy.context, geometry_changed_objects, dof_viz_state)
-
-	# Tag all relevant viewports for redraw
+	# Objects may also have moved in or out of the scope
+	if cache is not None:
+		cache["complete"] = False
+
+# Updates of more objects redraw every overlay viewport instead of looking up their scenes
+MAX_REDRAW_LOOKUPS = 64
+
+def existing_scene_keys():
+	"""Cache keys of every scene and view layer of the file"""
+	return {batch_cache.scene_key(scene, view_layer) for scene in bpy.data.scenes for view_layer in scene.view_layers}
+
+def tag_redraw_areas(scene=None, objects=()):
+	"""
+	Tag the viewports with overlay handlers for redraw. With `scene`, only those of
+	windows showing it or another scene containing one of `objects`.
+	"""
+	scenes = None
+	if scene is not None and len(objects) <= MAX_REDRAW_LOOKUPS:
+		# Scenes to redraw, looked up once per object rather than per object and window
+		scenes = {scene}
+		for name in objects:
+			obj = bpy.data.objects.get(name)
+			if obj is not None:
+				scenes.update(obj.users_scene)
+
 	for window in bpy.context.window_manager.windows:
-		for area_index, area in enumerate(window.screen.areas):
-			if area.type == 'VIEW_3D' and area_index in dof_viz_state["area_handlers"]:
+		if scenes is not None and window.scene not in scenes:
+			continue
+		for area in window.screen.areas:
+			if area.type == 'VIEW_3D' and area.as_pointer() in dof_viz_state["area_handlers"]:
 				area.tag_redraw()
 
+def get_visible_mesh_names(context, state, updated=None):
+	"""
+	Visible meshes in the overlay scope; objects or the camera moving in or out of it show
+	up as visibility changes. Only the objects in `updated` are tested against the scope
+	again, unless the camera or the scope settings changed (all of them with None).
+	"""
+	meshes = (obj for obj in context.visible_objects if obj.type == 'MESH')
+	return scope.filter_names(context.scene, meshes, batch_cache.scope_cache(state), updated)
+
+def scope_updates(records, state):
+	"""Objects whose scope test the update `records` may change, None when all may"""
+	if any(record["type"] == 'Collection' for record in records):
+		return None
+	names = {record["name"] for record in records if record["type"] == 'Object'}
+	if any(record["type"] == 'Mesh' and record["geometry"] for record in records):
+		names |= change_detection.changed_objects(records, batch_cache.mesh_users(state))
+	return names
+
+def get_camera_name(context):
+	camera = context.scene.camera
+	return camera.name if camera else None
+
+def process_depsgraph_update(context, records, state):
+	"""
+	Detect what changed in snapshotted depsgraph update records and rebuild the affected batches.
+	Kept separate from the handler so it can be driven directly (e.g. by benchmarks).
+	Returns True if any batch changed.
+	"""
+
+	return change_detection.process_update(
+		state, records,
+		lambda: get_visible_mesh_names(context, state, scope_updates(records, state)),
+		lambda: get_camera_name(context),
+		lambda: create_batches(context, state),
+		lambda names: update_specific_batches(context, names, state),
+	)
+
 def update_handlers(context):
 	"""
 	Manage draw handlers based on current UI settings.
@@ -118,84 +169,104 @@ def update_handlers(context):
 	unregisters handlers for disabled areas, and manages the global depsgraph handler.
 	"""
 
-	area_index = get_area_index(context)
-	if area_index == -1:
+	if context.area is None:
 		return
+	area_key = context.area.as_pointer()
+
+	area_enabled = any(get_area_dof_setting(context, name) for name in AREA_SETTINGS)
 
-	area_enabled = (get_area_dof_setting(context, "show_depth_of_field") or 
-					get_area_dof_setting(context, "show_focal_plane") or 
-					get_area_dof_setting(context, "show_dof_limits") or
-					get_area_dof_setting(context, "show_text_info"))
+	if area_enabled and area_key not in dof_viz_state["area_handlers"]:
+		register_area_handlers(context, area_key)
+	elif not area_enabled and area_key in dof_viz_state["area_handlers"]:
+		unregister_area_handlers(area_key)
 
-	if area_enabled and area_index not in dof_viz_state["area_handlers"]:
-		register_area_handlers(context, area_index)
-	elif not area_enabled and area_index in dof_viz_state["area_handlers"]:
-		unregister_area_handlers(area_index)
+	update_depsgraph_handler()
+	update_contour_geometry()
+
+def update_contour_geometry():
+	"""Keep the indexed geometry of the exact contour lines in the batches while an area uses them"""
+	state = dof_viz_state
+	enabled = any_area_enabled(bpy.data.screens, ("use_exact_contours",))
+	if enabled == state["contour_geometry"]:
+		return
+	state["contour_geometry"] = enabled
+	if enabled:
+		# Batches built without it are rebuilt in time slices from the next draw
+		batch_cache.invalidate_geometry(state)
+	else:
+		drop_contour_geometry(state)
+		contours.clear()
 
-	# Manage global depsgraph handler
-	any_area_enabled = is_any_area_enabled()
-	if any_area_enabled and dof_viz_state["depsgraph_handler"] is None:
+def update_depsgraph_handler():
+	"""Install the global depsgraph handler while any area has the overlay enabled, shown or not"""
+	enabled = any_area_enabled(bpy.data.screens)
+	if enabled and dof_viz_state["depsgraph_handler"] is None:
 		dof_viz_state["depsgraph_handler"] = on_depsgraph_update
 		if dof_viz_state["depsgraph_handler"] not in bpy.app.handlers.depsgraph_update_post:
 			bpy.app.handlers.depsgraph_update_post.append(dof_viz_state["depsgraph_handler"])
-	elif not any_area_enabled and dof_viz_state["depsgraph_handler"] is not None:
+	elif not enabled and dof_viz_state["depsgraph_handler"] is not None:
 		if dof_viz_state["depsgraph_handler"] in bpy.app.handlers.depsgraph_update_post:
 			bpy.app.handlers.depsgraph_update_post.remove(dof_viz_state["depsgraph_handler"])
 		dof_viz_state["depsgraph_handler"] = None
 
 # --- Handler Registration ---
-def register_area_handlers(context, area_index):
+def register_area_handlers(context, area_key, build_batches=True):
 	"""
-	Register draw handlers for a specific 3D viewport area.
+	Register draw handlers for a specific 3D viewport area (keyed by area.as_pointer()).
 	Creates both overlay drawing and text display handlers, and ensures
-	GPU batches are available for rendering.
+	GPU batches are available for rendering unless `build_batches` is False.
 	"""
 
 	state = dof_viz_state
-	if area_index in state["area_handlers"]:
+	if area_key in state["area_handlers"]:
 		return
 
 	# Create batches if not already created
-	if not state["mesh_batches"]:
+	batch_cache.select_scene(state, batch_cache.scene_key(context.scene, context.view_layer))
+	if build_batches and not state["mesh_batches"] and state["prewarm"] is None:
 		create_batches(context, dof_viz_state)
 
 	# Register handlers for this specific area
 	draw_handler = bpy.types.SpaceView3D.draw_handler_add(
-		lambda ctx: draw_dof_overlay(ctx, area_index), 
+		lambda ctx: draw_dof_overlay(ctx, area_key), 
 		(context,), 'WINDOW', 'POST_VIEW'
 	)
 	text_handler = bpy.types.SpaceView3D.draw_handler_add(
-		lambda ctx: draw_dof_info_text(ctx, area_index), 
+		lambda ctx: draw_dof_pixel_overlays(ctx, area_key), 
 		(context,), 'WINDOW', 'POST_PIXEL'
 	)
 
-	state["area_handlers"][area_index] = {
+	state["area_handlers"][area_key] = {
 		"draw_handler": draw_handler,
 		"text_handler": text_handler
 	}
 
-def unregister_area_handlers(area_index):
+def unregister_area_handlers(area_key):
 	"""
 	Remove draw handlers for a specific area and clean up associated resources.
 	If no areas remain active, clears global mesh batches and shader state.
 	"""
 
 	state = dof_viz_state
-	if area_index not in state["area_handlers"]:
+	if area_key not in state["area_handlers"]:
 		return
 
-	handlers = state["area_handlers"][area_index]
+	handlers = state["area_handlers"][area_key]
 
 	if handlers["draw_handler"] is not None:
 		bpy.types.SpaceView3D.draw_handler_remove(handlers["draw_handler"], 'WINDOW')
 	if handlers["text_handler"] is not None:
 		bpy.types.SpaceView3D.draw_handler_remove(handlers["text_handler"], 'WINDOW')
 
-	del state["area_handlers"][area_index]
+	del state["area_handlers"][area_key]
 
 	# Clean up global state if no areas are active
 	if not state["area_handlers"]:
-		state["mesh_batches"].clear()
+		state["prewarm"] = None
+		state["timeline"] = None
+		batch_cache.clear_all(state)
+		contours.clear()
+		focus.clear()
 		state["shader"] = None
 
 def unregister_all_handlers():
@@ -203,8 +274,18 @@ def unregister_all_handlers():
 	state = dof_viz_state
 
 	# Unregister all area handlers
-	for area_index in list(state["area_handlers"].keys()):
-		unregister_area_handlers(area_index)
+	for area_key in list(state["area_handlers"].keys()):
+		unregister_area_handlers(area_key)
+
+	if bpy.app.timers.is_registered(prewarm_step):
+		bpy.app.timers.unregister(prewarm_step)
+
+	# Also reached from load_post: the timeline and focus trees of the previous file
+	# may match scene, camera and object names in the new one
+	state["timeline"] = None
+	state["contour_geometry"] = False
+	focus.clear()
+	bvh_cache.clear()
 
 	# Unregister depsgraph handler
 	if state["depsgraph_handler"] is not None:
@@ -212,6 +293,54 @@ def unregister_all_handlers():
 			bpy.app.handlers.depsgraph_update_post.remove(state["depsgraph_handler"])
 		state["depsgraph_handler"] = None
 
+# --- File Load ---
+PREWARM_SLICE = 0.01  # Seconds of batch building per timer tick
+
+def restore_area_handlers(context):
+	"""
+	Re-register the handlers of viewports whose settings were saved with the file,
+	then build their batches in time slices from a timer so the UI stays responsive.
+	"""
+
+	# Stored centers follow the layout of the loaded screens
+	anchor_area_settings(shown_screens())
+
+	restored = False
+	for screen in bpy.data.screens:
+		if not screen.dof_viz_areas:
+			continue
+		for area in screen.areas:
+			settings = find_area_settings(screen, area) if area.type == 'VIEW_3D' else None
+			if settings is not None and any(getattr(settings, name) for name in AREA_SETTINGS):
+				register_area_handlers(context, area.as_pointer(), build_batches=False)
+				restored = True
+
+	if restored:
+		update_depsgraph_handler()
+		update_contour_geometry()
+		start_prewarm(context.scene, context.view_layer)
+
+def start_prewarm(scene, view_layer, clear=True):
+	dof_viz_state["prewarm"] = create_batches_sliced(scene, view_layer, dof_viz_state, clear)
+	if not bpy.app.timers.is_registered(prewarm_step):
+		bpy.app.timers.register(prewarm_step, first_interval=0.0)
+
+def prewarm_step():
+	"""Timer callback building batches for up to PREWARM_SLICE seconds per tick"""
+	steps = dof_viz_state["prewarm"]
+	if steps is None:
+		return None
+
+	deadline = time.perf_counter() + PREWARM_SLICE
+	for _ in steps:
+		if time.perf_counter() >= deadline:
+			tag_redraw_areas()
+			return 0.0
+
+	dof_viz_state["prewarm"] = None
+	tag_redraw_areas()
+	return None
+
 def calculate_dof_info(context):
 	"""Calculate DoF parameters using a physically-based model and store in state"""
 
@@ -220,48 +349,33 @@ def calculate_dof_info(context):
 		dof_viz_state["info_data"] = {}
 		return
 
+	# During playback read the precomputed timeline instead of solving each frame
+	if context.screen and context.screen.is_animation_playing:
+		cached_info = timeline.get_cached_info(dof_viz_state, context.scene, scene_cam, context.scene.frame_current)
+		if cached_info is not None:
+			dof_viz_state["info_data"] = cached_info
+			return
+
 	cam_data = scene_cam.data
 	fstop = cam_data.dof.aperture_fstop
 	focal_length_m = cam_data.lens / 1000.0
 	sensor_width_m = cam_data.sensor_width / 1000.0
 
-	focus_object = cam_data.dof.focus_object
-	if focus_object:
-		depsgraph = context.evaluated_depsgraph_get()
-		cam_eval = scene_cam.evaluated_get(depsgraph)
-		focus_object_eval = focus_object.evaluated_get(depsgraph)
-		focus_distance = (cam_eval.matrix_world.translation - focus_object_eval.matrix_world.translation).length
-	else:
-		focus_distance = cam_data.dof.focus_distance
-
-	dof_near, dof_far, hyperfocal = 0.0, float('inf'), float('inf')
-
-	if fstop > 0 and focus_distance > 0:
-		coc = sensor_width_m / 1500
-		hyperfocal = (focal_length_m**2) / (fstop * coc) + focal_length_m
+	depsgraph = context.evaluated_depsgraph_get()
+	cam_eval = scene_cam.evaluated_get(depsgraph)
+	focus_distance = focus.focus_distance(context.scene, cam_eval, depsgraph)
 
-		s_minus_f = focus_distance - focal_length_m
-		if s_minus_f > 0:
-			if focus_distance >= hyperfocal:
-				dof_far = float('inf')
-			else:
-				dof_far = (hyperfocal * focus_distance) / (hyperfocal - s_minus_f)
+	info_data = dof_math.dof_info(focal_length_m, fstop, sensor_width_m, focus_distance)
+	# Focus object whose surface the ray missed, measured from its origin instead
+	info_data["focus_fallback"] = focus.focus_state["fallback"]
+	dof_viz_state["info_data"] = info_data
 
-			dof_near = (hyperfocal * focus_distance) / (hyperfocal + s_minus_f)
-
-	dof_viz_state["info_data"] = {
-		"focus_distance": focus_distance,
-		"dof_near": dof_near,
-		"dof_far": dof_far,
-		"hyperfocal": hyperfocal,
-	}
-
-def draw_dof_overlay(context, target_area_index):
+@profiler.profiled("draw_dof_overlay")
+def draw_dof_overlay(context, target_area):
 	"""Draw DoF visualization overlay in the 3D viewport."""
 
 	# Only draw if we're in the target area
-	current_area_index = get_area_index(context)
-	if current_area_index != target_area_index:
+	if not is_target_area(context, target_area):
 		return
 
 	scene_cam = context.scene.camera
@@ -285,20 +399,29 @@ def draw_dof_overlay(context, target_area_index):
 	focus_distance = info_data.get("focus_distance", 0.0)
 
 	# Check area-specific settings
-	area_show_dof = get_area_dof_setting_by_index(target_area_index, "show_depth_of_field")
-	area_show_focal_plane = get_area_dof_setting_by_index(target_area_index, "show_focal_plane")
-	area_show_limits = get_area_dof_setting_by_index(target_area_index, "show_dof_limits")
+	area_settings = find_area_settings(context.screen, context.area)
+	if area_settings is None:
+		return
+	area_show_dof = area_settings.show_depth_of_field
+	area_show_focal_plane = area_settings.show_focal_plane
+	area_show_limits = area_settings.show_dof_limits
+	use_exact_contours = area_settings.use_exact_contours
 
 	if not area_show_dof and not area_show_focal_plane and not area_show_limits:
 		return
 
 	state = dof_viz_state
+	batch_cache.select_scene(state, batch_cache.scene_key(context.scene, context.view_layer))
+	# Build the batches the scene lacks (first draw, updates while another scene was active)
+	if not state["complete"] and state["prewarm"] is None:
+		start_prewarm(context.scene, context.view_layer, clear=False)
+
 	scene_cam = context.scene.camera
 	region_3d = context.space_data.region_3d
 	if not scene_cam or not state["shader"] or not region_3d:
 		return
 
-	state["current_camera"] = scene_cam
+	state["current_camera"] = scene_cam.name
 
 	# --- Get Matrices ---
 	viewport_view_matrix = region_3d.view_matrix
@@ -346,15 +469,16 @@ def draw_dof_overlay(context, target_area_index):
 		focus_plane_tolerance = max(0.001, min(0.1, focus_distance * 0.005)) # Clamped between 0.001 and 0.1
 		shader.uniform_float("u_focus_plane_tolerance", focus_plane_tolerance)
 
-		shader.uniform_bool("u_show_focal_plane", area_show_focal_plane)
-		shader.uniform_bool("u_show_dof_limits", area_show_limits)
+		# Exact contours replace the shader's constant-width bands
+		shader.uniform_bool("u_show_focal_plane", area_show_focal_plane and not use_exact_contours)
+		shader.uniform_bool("u_show_dof_limits", area_show_limits and not use_exact_contours)
 		shader.uniform_bool("u_show_depth_of_field", area_show_dof)
 
 		camera_location = scene_cam.matrix_world.translation
 		sorted_batches = sorted([
 			((obj.matrix_world.translation - camera_location).length, obj, data)
 			for name, data in state["mesh_batches"].items()
-			if (obj := bpy.context.scene.objects.get(name)) and obj.visible_get()
+			if (obj := context.scene.objects.get(name)) and obj.visible_get()
 		], key=lambda x: x[0], reverse=True)
 
 		for _, obj, data in sorted_batches:
@@ -363,28 +487,52 @@ def draw_dof_overlay(context, target_area_index):
 			shader.uniform_float("u_modelViewProjectionMatrix", mvp_matrix)
 			shader.uniform_float("u_modelMatrix", model_matrix)
 			data["batch"].draw(shader)
+
+		if use_exact_contours and (area_show_focal_plane or area_show_limits):
+			contours.prune(state["mesh_batches"])
+			planes = contours.camera_planes(scene_cam, info_data, area_show_focal_plane, area_show_limits)
+			contours.draw_contours(context, [(obj, data) for _, obj, data in sorted_batches], planes)
 	finally:
 		gpu.state.blend_set(original_blend)
 		gpu.state.depth_test_set(original_depth_test)
 		gpu.state.face_culling_set('NONE')
 
-def draw_dof_info_text(context, target_area_index):
-	"""Draw DoF information text in the viewport."""
+def draw_dof_pixel_overlays(context, target_area):
+	"""Draw the screen-space overlays (text info and timeline graph) of an area."""
 
-	# Only draw if we're in the target area
-	current_area_index = get_area_index(context)
-	if current_area_index != target_area_index:
+	if not is_target_area(context, target_area) or not context.space_data.overlay.show_overlays:
+		return
+
+	# Matching the area scans the screen, so look its settings up once per redraw
+	area_settings = find_area_settings(context.screen, context.area)
+	if area_settings is None:
+		return
+
+	draw_dof_info_text(context, area_settings)
+	draw_dof_timeline(context, area_settings)
+
+def draw_dof_timeline(context, area_settings):
+	"""Draw the precomputed near/focus/far graph in the viewport."""
+
+	if not area_settings.show_dof_timeline:
 		return
 
 	scene_cam = context.scene.camera
-	if not scene_cam or not scene_cam.data.dof.use_dof:
+	cached = timeline.get_valid_timeline(dof_viz_state, context.scene, scene_cam) if scene_cam else None
+	if cached is None:
 		return
 
-	if not context.space_data.overlay.show_overlays:
+	timeline.draw_graph(context, cached)
+
+def draw_dof_info_text(context, area_settings):
+	"""Draw DoF information text in the viewport."""
+
+	scene_cam = context.scene.camera
+	if not scene_cam or not scene_cam.data.dof.use_dof:
 		return
 
 	# Check area-specific text info setting
-	if not get_area_dof_setting_by_index(target_area_index, "show_text_info"):
+	if not area_settings.show_text_info:
 		return
 
 	# Calculate DoF info
@@ -440,5 +588,25 @@ def draw_dof_info_text(context, target_area_index):
 		blf.draw(font_id, line)
 		y_pos -= line_height
 
+	if info_data.get("focus_fallback"):
+		blf.color(font_id, 1.0, 0.6, 0.2, 1.0)
+		blf.position(font_id, x_margin, y_pos, 0)
+		blf.draw(font_id, f"Focus ray misses {info_data['focus_fallback']}: origin distance")
+		y_pos -= line_height
+
+	# Optional profiler block
+	if profiler.is_enabled():
+		y_pos -= line_height * 0.5
+		blf.color(font_id, 1.0, 1.0, 1.0, 1.0)
+		blf.position(font_id, x_margin, y_pos, 0)
+		blf.draw(font_id, "Profiler")
+		y_pos -= line_height
+
+		blf.color(font_id, 1.0, 1.0, 1.0, 0.7)
+		for line in profiler.summary_lines():
+			blf.position(font_id, x_margin, y_pos, 0)
+			blf.draw(font_id, line)
+			y_pos -= line_height
+
 	# --- Cleanup ---
 	blf.disable(font_id, blf.SHADOW)
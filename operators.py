@@ -1,6 +1,16 @@
+import sys
+
 import bpy
+from bpy_extras.io_utils import ExportHelper
 from .properties import get_area_dof_setting, set_area_dof_setting
-from . import handlers
+from . import profiler, depsgraph_trace
+
+# The overlay modules (handlers, batches, NumPy, gpu...) are imported by the operators
+# that need them, so registering the add-on stays cheap when the overlay is never used.
+
+def loaded_module(name):
+	"""The add-on submodule `name` if it was already imported, else None"""
+	return sys.modules.get(f"{__package__}.{name}")
 
 class DOF_VIZ_OT_toggle_setting(bpy.types.Operator):
 	"""Toggle DoF visualization setting for current area"""
@@ -11,6 +21,8 @@ class DOF_VIZ_OT_toggle_setting(bpy.types.Operator):
 	setting_name: bpy.props.StringProperty()
 
 	def execute(self, context):
+		from . import handlers
+
 		current_value = get_area_dof_setting(context, self.setting_name)
 		new_value = not current_value
 		set_area_dof_setting(context, self.setting_name, new_value)
@@ -25,8 +37,273 @@ class DOF_VIZ_OT_toggle_setting(bpy.types.Operator):
 
 		return {'FINISHED'}
 
+class DOF_VIZ_OT_export_profile(bpy.types.Operator, ExportHelper):
+	"""Export recorded profiler timings to a JSON file"""
+	bl_idname = "dof_viz.export_profile"
+	bl_label = "Export DoF Profile"
+
+	filename_ext = ".json"
+	filter_glob: bpy.props.StringProperty(default="*.json", options={'HIDDEN'})
+
+	def execute(self, context):
+		if not profiler.profiler_state["stages"]:
+			self.report({'WARNING'}, "No profiler samples recorded yet")
+			return {'CANCELLED'}
+
+		profiler.export_json(self.filepath)
+		self.report({'INFO'}, f"Profile written to {self.filepath}")
+		return {'FINISHED'}
+
+class DOF_VIZ_OT_start_trace_recording(bpy.types.Operator, ExportHelper):
+	"""Record depsgraph updates seen by the overlay to a trace file for offline replay"""
+	bl_idname = "dof_viz.start_trace_recording"
+	bl_label = "Record Depsgraph Trace"
+
+	filename_ext = ".jsonl"
+	filter_glob: bpy.props.StringProperty(default="*.jsonl", options={'HIDDEN'})
+
+	def execute(self, context):
+		depsgraph_trace.start_recording(self.filepath)
+		self.report({'INFO'}, f"Recording depsgraph trace to {self.filepath}")
+		return {'FINISHED'}
+
+class DOF_VIZ_OT_stop_trace_recording(bpy.types.Operator):
+	"""Stop recording the depsgraph trace"""
+	bl_idname = "dof_viz.stop_trace_recording"
+	bl_label = "Stop Depsgraph Trace"
+
+	@classmethod
+	def poll(cls, context):
+		return depsgraph_trace.is_recording()
+
+	def execute(self, context):
+		path, events = depsgraph_trace.stop_recording()
+		self.report({'INFO'}, f"Recorded {events} events to {path}")
+		return {'FINISHED'}
+
+class DOF_VIZ_OT_scope_collection_add(bpy.types.Operator):
+	"""Add the active collection to the overlay scope list"""
+	bl_idname = "dof_viz.scope_collection_add"
+	bl_label = "Add Scope Collection"
+	bl_options = {'REGISTER', 'UNDO'}
+
+	def execute(self, context):
+		settings = context.scene.dof_viz_scope
+		item = settings.collections.add()
+		active = context.view_layer.active_layer_collection.collection
+		if active != context.scene.collection:
+			item.collection = active
+		settings.active_index = len(settings.collections) - 1
+		return {'FINISHED'}
+
+class DOF_VIZ_OT_scope_collection_remove(bpy.types.Operator):
+	"""Remove the selected collection from the overlay scope list"""
+	bl_idname = "dof_viz.scope_collection_remove"
+	bl_label = "Remove Scope Collection"
+	bl_options = {'REGISTER', 'UNDO'}
+
+	@classmethod
+	def poll(cls, context):
+		return len(context.scene.dof_viz_scope.collections) > 0
+
+	def execute(self, context):
+		settings = context.scene.dof_viz_scope
+		settings.collections.remove(settings.active_index)
+		settings.active_index = min(settings.active_index, len(settings.collections) - 1)
+		return {'FINISHED'}
+
+class DOF_VIZ_OT_precompute_timeline(bpy.types.Operator):
+	"""Sample the scene camera over the frame range and solve the DoF for every frame"""
+	bl_idname = "dof_viz.precompute_timeline"
+	bl_label = "Precompute DoF Timeline"
+	bl_options = {'REGISTER'}
+
+	@classmethod
+	def poll(cls, context):
+		return context.scene.camera is not None and context.scene.camera.type == 'CAMERA'
+
+	def execute(self, context):
+		from . import handlers, timeline
+
+		scene = context.scene
+		cached = timeline.precompute(scene, scene.camera, handlers.dof_viz_state, frame_step=scene.frame_step)
+		self.report({'INFO'}, f"DoF timeline computed for {len(cached['frames'])} frames")
+
+		for area in context.screen.areas:
+			if area.type == 'VIEW_3D':
+				area.tag_redraw()
+
+		return {'FINISHED'}
+
+class DOF_VIZ_OT_export_contours(bpy.types.Operator):
+	"""Create curve objects from the exact focal plane and DoF limit contours of the overlay meshes"""
+	bl_idname = "dof_viz.export_contours"
+	bl_label = "Export DoF Contours as Curves"
+	bl_options = {'REGISTER', 'UNDO'}
+
+	focal_plane: bpy.props.BoolProperty(name="Focal Plane", default=True)
+	dof_limits: bpy.props.BoolProperty(name="DoF Limits", default=True)
+
+	@classmethod
+	def poll(cls, context):
+		camera = context.scene.camera
+		return camera is not None and camera.type == 'CAMERA' and camera.data.dof.use_dof
+
+	def execute(self, context):
+		from . import handlers, contours, batch_cache
+
+		state = handlers.dof_viz_state
+		batch_cache.select_scene(state, batch_cache.scene_key(context.scene, context.view_layer))
+		objects = [
+			(obj, data) for name, data in state["mesh_batches"].items()
+			if (obj := context.scene.objects.get(name)) and obj.visible_get()
+		]
+		if not objects:
+			self.report({'WARNING'}, "Enable the DoF overlay in a viewport first")
+			return {'CANCELLED'}
+		# Batches only keep the geometry of the contours while Exact Lines is on
+		objects = [(obj, data) for obj, data in objects if data.get("positions") is not None]
+		if not objects:
+			self.report({'WARNING'}, "Enable Exact Lines in a viewport first")
+			return {'CANCELLED'}
+
+		handlers.calculate_dof_info(context)
+		planes = contours.camera_planes(context.scene.camera, state["info_data"], self.focal_plane, self.dof_limits)
+		created = contours.create_curves(context, objects, planes)
+		self.report({'INFO'}, f"Created {len(created)} contour curves")
+		return {'FINISHED'}
+
+class DOF_VIZ_OT_export_timeline(bpy.types.Operator, ExportHelper):
+	"""Export the precomputed DoF timeline to a CSV file"""
+	bl_idname = "dof_viz.export_timeline"
+	bl_label = "Export DoF Timeline"
+
+	filename_ext = ".csv"
+	filter_glob: bpy.props.StringProperty(default="*.csv", options={'HIDDEN'})
+
+	@classmethod
+	def poll(cls, context):
+		# Polled on every redraw of the overlay popover, so don't import the overlay modules
+		handlers = loaded_module("handlers")
+		return handlers is not None and handlers.dof_viz_state.get("timeline") is not None
+
+	def execute(self, context):
+		from . import handlers, timeline
+
+		timeline.export_csv(handlers.dof_viz_state["timeline"], self.filepath)
+		self.report({'INFO'}, f"DoF timeline written to {self.filepath}")
+		return {'FINISHED'}
+
+class DOF_VIZ_OT_analyze_focus(bpy.types.Operator):
+	"""Classify objects as near-blurred, in focus, far-blurred or straddling for every frame of the range"""
+	bl_idname = "dof_viz.analyze_focus"
+	bl_label = "Analyze Focus"
+	bl_options = {'REGISTER'}
+
+	@classmethod
+	def poll(cls, context):
+		return context.scene.camera is not None and context.scene.camera.type == 'CAMERA'
+
+	def execute(self, context):
+		from . import handlers, timeline, analysis
+
+		scene = context.scene
+		objects = analysis.default_objects(context)
+		if not objects:
+			self.report({'WARNING'}, "No mesh objects to analyze")
+			return {'CANCELLED'}
+
+		if not scene.camera.data.dof.use_dof:
+			self.report({'WARNING'}, "Enable depth of field on the scene camera first")
+			return {'CANCELLED'}
+
+		frames = timeline.frame_range(scene, frame_step=scene.frame_step)
+		result = analysis.classify_objects(scene, scene.camera, objects, frames, handlers.dof_viz_state)
+		analysis.store_report(scene, result)
+
+		self.report({'INFO'}, f"Analyzed {len(objects)} objects over {len(frames)} frames")
+		return {'FINISHED'}
+
+class DOF_VIZ_OT_export_focus_report(bpy.types.Operator, ExportHelper):
+	"""Export the focus report to a CSV or JSON file"""
+	bl_idname = "dof_viz.export_focus_report"
+	bl_label = "Export Focus Report"
+
+	filename_ext = ".csv"
+	filter_glob: bpy.props.StringProperty(default="*.csv;*.json", options={'HIDDEN'})
+	check_extension = False
+
+	@classmethod
+	def poll(cls, context):
+		return len(context.scene.dof_viz_report.items) > 0
+
+	def execute(self, context):
+		from . import analysis
+
+		analysis.export_report(context.scene.dof_viz_report, self.filepath)
+		self.report({'INFO'}, f"Focus report written to {self.filepath}")
+		return {'FINISHED'}
+
+class DOF_VIZ_OT_render_coc_maps(bpy.types.Operator):
+	"""Render circle of confusion maps of the scene camera on the CPU (works in background mode)"""
+	bl_idname = "dof_viz.render_coc_maps"
+	bl_label = "Render CoC Maps"
+	bl_options = {'REGISTER'}
+
+	directory: bpy.props.StringProperty(name="Output Directory", subtype='DIR_PATH', default="//coc_maps/")
+	use_scene_range: bpy.props.BoolProperty(name="Scene Frame Range", default=True)
+	frame_start: bpy.props.IntProperty(name="Start", default=1)
+	frame_end: bpy.props.IntProperty(name="End", default=1)
+	resolution_scale: bpy.props.FloatProperty(
+		name="Resolution Scale", description="Fraction of the scene render resolution",
+		default=0.25, min=0.01, max=1.0, subtype='FACTOR',
+	)
+	tile_size: bpy.props.IntProperty(name="Tile Size", default=32, min=4, max=512)
+	workers: bpy.props.IntProperty(name="Workers", description="Worker threads, 0 for automatic", default=0, min=0)
+
+	@classmethod
+	def poll(cls, context):
+		return context.scene.camera is not None and context.scene.camera.type == 'CAMERA'
+
+	def invoke(self, context, event):
+		return context.window_manager.invoke_props_dialog(self)
+
+	def execute(self, context):
+		from . import handlers, timeline, coc_render
+
+		scene = context.scene
+		if self.use_scene_range:
+			frames = timeline.frame_range(scene, frame_step=scene.frame_step)
+		else:
+			frames = timeline.frame_range(scene, self.frame_start, self.frame_end)
+
+		directory = bpy.path.abspath(self.directory)
+		written = coc_render.render_frames(
+			context, handlers.dof_viz_state, frames, directory,
+			self.resolution_scale, self.tile_size, self.workers or None,
+		)
+		self.report({'INFO'}, f"Wrote {len(written)} CoC images to {directory}")
+		return {'FINISHED'}
+
+classes = (
+	DOF_VIZ_OT_toggle_setting,
+	DOF_VIZ_OT_export_profile,
+	DOF_VIZ_OT_start_trace_recording,
+	DOF_VIZ_OT_stop_trace_recording,
+	DOF_VIZ_OT_scope_collection_add,
+	DOF_VIZ_OT_scope_collection_remove,
+	DOF_VIZ_OT_precompute_timeline,
+	DOF_VIZ_OT_export_contours,
+	DOF_VIZ_OT_export_timeline,
+	DOF_VIZ_OT_analyze_focus,
+	DOF_VIZ_OT_export_focus_report,
+	DOF_VIZ_OT_render_coc_maps,
+)
+
 def register():
-	bpy.utils.register_class(DOF_VIZ_OT_toggle_setting)
+	for cls in classes:
+		bpy.utils.register_class(cls)
 
 def unregister():
-	bpy.utils.unregister_class(DOF_VIZ_OT_toggle_setting)
+	for cls in reversed(classes):
+		bpy.utils.unregister_class(cls)
@@ -0,0 +1,164 @@
+import json
+import time
+from functools import wraps
+
+#############################################################
+#
+# Hot-Path Profiler
+# Low-overhead stage timings and counters kept in fixed-size
+# ring buffers. Disabled by default, toggled from the addon
+# preferences.
+#
+#############################################################
+
+RING_SIZE = 256
+
+profiler_state = {
+	"enabled": False,
+	"stages": {},    # stage name -> RingBuffer of durations (seconds)
+	"counters": {},  # counter name -> latest value
+}
+
+class RingBuffer:
+	"""Fixed-size buffer keeping the most recent samples"""
+
+	__slots__ = ("samples", "index", "count", "total")
+
+	def __init__(self, size=RING_SIZE):
+		self.samples = [0.0] * size
+		self.index = 0
+		self.count = 0
+		self.total = 0
+
+	def push(self, value):
+		self.samples[self.index] = value
+		self.index = (self.index + 1) % len(self.samples)
+		self.count = min(self.count + 1, len(self.samples))
+		self.total += 1
+
+	def values(self):
+		"""Samples in chronological order"""
+		if self.count < len(self.samples):
+			return self.samples[:self.count]
+		return self.samples[self.index:] + self.samples[:self.index]
+
+def percentile(values, fraction):
+	"""Nearest-rank percentile of an unsorted list"""
+	if not values:
+		return 0.0
+	ordered = sorted(values)
+	rank = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+	return ordered[rank]
+
+def is_enabled():
+	return profiler_state["enabled"]
+
+def set_enabled(enabled):
+	"""Enable or disable recording, dropping samples when turned off"""
+	profiler_state["enabled"] = bool(enabled)
+	if not enabled:
+		reset()
+
+def reset():
+	profiler_state["stages"].clear()
+	profiler_state["counters"].clear()
+
+# --- Recording ---
+class _Stage:
+	__slots__ = ("name", "start")
+
+	def __init__(self, name):
+		self.name = name
+
+	def __enter__(self):
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		record(self.name, time.perf_counter() - self.start)
+		return False
+
+class _NullStage:
+	__slots__ = ()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		return False
+
+_NULL_STAGE = _NullStage()
+
+def stage(name):
+	"""Context manager timing a block; a shared no-op when disabled"""
+	if not profiler_state["enabled"]:
+		return _NULL_STAGE
+	return _Stage(name)
+
+def record(name, duration):
+	"""Push a duration (seconds) for the given stage"""
+	stages = profiler_state["stages"]
+	buffer = stages.get(name)
+	if buffer is None:
+		buffer = stages[name] = RingBuffer()
+	buffer.push(duration)
+
+def set_counter(name, value):
+	if profiler_state["enabled"]:
+		profiler_state["counters"][name] = value
+
+def profiled(name=None):
+	"""Decorator timing every call of the wrapped function as one stage"""
+	def decorator(func):
+		stage_name = name or func.__name__
+
+		@wraps(func)
+		def wrapper(*args, **kwargs):
+			if not profiler_state["enabled"]:
+				return func(*args, **kwargs)
+			start = time.perf_counter()
+			try:
+				return func(*args, **kwargs)
+			finally:
+				record(stage_name, time.perf_counter() - start)
+		return wrapper
+	return decorator
+
+# --- Reporting ---
+def summary():
+	"""Rolling p50/p95 (milliseconds) and sample counts for every stage"""
+	result = {}
+	for name, buffer in profiler_state["stages"].items():
+		values = buffer.values()
+		result[name] = {
+			"p50_ms": percentile(values, 0.50) * 1000.0,
+			"p95_ms": percentile(values, 0.95) * 1000.0,
+			"samples": buffer.count,
+			"calls": buffer.total,
+		}
+	return result
+
+def summary_lines():
+	"""Human readable summary used by the text info overlay"""
+	lines = []
+	for name, stats in sorted(summary().items()):
+		lines.append(f"{name}: p50 {stats['p50_ms']:.2f}ms / p95 {stats['p95_ms']:.2f}ms ({stats['calls']})")
+
+	counters = profiler_state["counters"]
+	if "batch_count" in counters:
+		lines.append(f"Batches: {counters['batch_count']}")
+	if "batch_bytes" in counters:
+		lines.append(f"Batch Memory: {counters['batch_bytes'] / (1024 * 1024):.2f} MB")
+	return lines
+
+def export_json(filepath):
+	"""Write the rolling summary and raw samples to a JSON file"""
+	data = {
+		"created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"ring_size": RING_SIZE,
+		"summary": summary(),
+		"counters": dict(profiler_state["counters"]),
+		"samples": {name: buffer.values() for name, buffer in profiler_state["stages"].items()},
+	}
+	with open(filepath, "w", encoding="utf-8") as f:
+		json.dump(data, f, indent=2)
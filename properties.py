@@ -1,49 +1,299 @@
 import bpy
+from . import profiler, depsgraph_trace
 
 #############################################################
 # 
 # Per-Area Settings Management
 # Functions for storing and retrieving DoF visualization 
-# settings on a per-viewport basis using WindowManager
+# settings on a per-viewport basis. Settings are stored on
+# the screen (so they are saved with the file), one entry
+# per 3D viewport keyed by the area's normalized center.
+# Matches are memoized per screen until its layout changes.
 # 
 #############################################################
-def get_area_index(context):
-	"""Get the current area index"""
-	area = context.area
-	if not area:
-		return -1
+# Per-area toggles; any of them enabled activates the overlay handlers for that area
+AREA_SETTINGS = (
+	"show_depth_of_field",
+	"show_focal_plane",
+	"show_dof_limits",
+	"show_text_info",
+	"show_dof_timeline",
+)
 
-	for i, a in enumerate(context.screen.areas):
-		if a == area:
-			return i
-	return -1
+# Largest center offset (fraction of the screen) still matching a stored area
+AREA_MATCH_TOLERANCE = 0.05
 
-def get_area_property_name(area_index, prop_name):
-	"""Generate area-specific property name"""
-	return f"dof_viz_{area_index}_{prop_name}"
+# Largest offset for areas and settings left unmatched, e.g. after a splitter was dragged
+# further than the tolerance between two redraws
+AREA_FALLBACK_TOLERANCE = 0.25
+
+# screen.as_pointer() -> (layout signature, {area.as_pointer(): settings index})
+_area_matches = {}
+
+class DoFVizAreaSettings(bpy.types.PropertyGroup):
+	"""Overlay toggles of one 3D viewport"""
+	center: bpy.props.FloatVectorProperty(size=2)  # area center, normalized to the screen bounds
+	show_depth_of_field: bpy.props.BoolProperty()
+	show_focal_plane: bpy.props.BoolProperty()
+	show_dof_limits: bpy.props.BoolProperty()
+	show_text_info: bpy.props.BoolProperty()
+	show_dof_timeline: bpy.props.BoolProperty()
+	use_exact_contours: bpy.props.BoolProperty()
+
+def screen_bounds(screen):
+	"""(min x, min y, width, height) of the areas of `screen`"""
+	min_x = min(a.x for a in screen.areas)
+	min_y = min(a.y for a in screen.areas)
+	width = max(a.x + a.width for a in screen.areas) - min_x
+	height = max(a.y + a.height for a in screen.areas) - min_y
+	return min_x, min_y, max(width, 1), max(height, 1)
+
+def area_center(screen, area, bounds=None):
+	"""
+	Center of `area` normalized to the bounds of its screen. Unlike the area pointer, it
+	survives saving and reloading, and unlike the index, splitting or joining other areas.
+	"""
+	min_x, min_y, width, height = bounds or screen_bounds(screen)
+	return (
+		(area.x + area.width * 0.5 - min_x) / width,
+		(area.y + area.height * 0.5 - min_y) / height,
+	)
+
+def view_areas(screen):
+	return [area for area in screen.areas if area.type == 'VIEW_3D']
+
+def layout_signature(screen):
+	"""Changes when areas of `screen` are added, removed or resized, or settings are added"""
+	return len(screen.dof_viz_areas), tuple((a.as_pointer(), a.type, a.x, a.y, a.width, a.height) for a in screen.areas)
+
+def match_areas(screen):
+	"""
+	Index of the stored settings of each 3D viewport of `screen`, keyed by area pointer.
+	Areas and settings are paired nearest center first, within AREA_MATCH_TOLERANCE; those
+	left over are then paired the same way within AREA_FALLBACK_TOLERANCE.
+	"""
+	bounds = screen_bounds(screen)
+	centers = {area.as_pointer(): area_center(screen, area, bounds) for area in view_areas(screen)}
+	pairs = sorted(
+		(max(abs(item.center[0] - center[0]), abs(item.center[1] - center[1])), pointer, index)
+		for pointer, center in centers.items()
+		for index, item in enumerate(screen.dof_viz_areas)
+	)
+
+	matches = {}
+	for tolerance in (AREA_MATCH_TOLERANCE, AREA_FALLBACK_TOLERANCE):
+		used = set(matches.values())
+		for distance, pointer, index in pairs:
+			if distance > tolerance:
+				break
+			if pointer not in matches and index not in used:
+				matches[pointer] = index
+				used.add(index)
+	return matches
+
+def area_matches(screen):
+	"""match_areas of `screen`, memoized until its layout changes (then re-anchored from a timer)"""
+	key = screen.as_pointer()
+	signature = layout_signature(screen)
+	cached = _area_matches.get(key)
+	if cached is not None and cached[0] == signature:
+		return cached[1]
+
+	matches = match_areas(screen)
+	_area_matches[key] = (signature, matches)
+	if cached is not None and not bpy.app.timers.is_registered(anchor_shown_areas):
+		# Draw callbacks can't write properties
+		bpy.app.timers.register(anchor_shown_areas, first_interval=0.0)
+	return matches
+
+def find_area_settings(screen, area):
+	"""Stored settings of the 3D viewport `area`, or None"""
+	if screen is None or area is None or not screen.dof_viz_areas:
+		return None
+	index = area_matches(screen).get(area.as_pointer())
+	return None if index is None else screen.dof_viz_areas[index]
+
+def shown_screens():
+	"""Screens shown in a window"""
+	return [window.screen for window in bpy.context.window_manager.windows]
+
+def anchor_area_settings(screens):
+	"""
+	Move the stored center of matched settings to their area's current layout, so later
+	layout changes are measured from there. Writes properties: not for draw callbacks.
+	"""
+	for screen in screens:
+		if not screen.dof_viz_areas:
+			continue
+		bounds = screen_bounds(screen)
+		for area in view_areas(screen):
+			settings = find_area_settings(screen, area)
+			if settings is None:
+				continue
+			center = area_center(screen, area, bounds)
+			if max(abs(settings.center[0] - center[0]), abs(settings.center[1] - center[1])) > 1e-4:
+				settings.center = center
+		_area_matches.pop(screen.as_pointer(), None)
+
+def anchor_shown_areas():
+	"""Timer callback anchoring the settings of the shown screens after a layout change"""
+	anchor_area_settings(shown_screens())
+	return None
+
+def clear_area_matches():
+	"""Forget memoized matches (file load: area pointers may be reused)"""
+	_area_matches.clear()
+
+def get_area_setting(screen, area, prop_name, default=False):
+	"""Get DoF setting of an area"""
+	settings = find_area_settings(screen, area)
+	return getattr(settings, prop_name) if settings else default
 
 def get_area_dof_setting(context, prop_name, default=False):
 	"""Get DoF setting for current area"""
-	area_index = get_area_index(context)
-	if area_index == -1:
-		return default
-
-	prop_name = get_area_property_name(area_index, prop_name)
-	return getattr(context.window_manager, prop_name, default)
+	return get_area_setting(context.screen, context.area, prop_name, default)
 
 def set_area_dof_setting(context, prop_name, value):
 	"""Set DoF setting for current area"""
-	area_index = get_area_index(context)
-	if area_index == -1:
+	screen, area = context.screen, context.area
+	if screen is None or area is None:
 		return
 
-	full_prop_name = get_area_property_name(area_index, prop_name)
+	settings = find_area_settings(screen, area)
+	if settings is None:
+		prune_area_settings(screen)
+		settings = screen.dof_viz_areas.add()
+		settings.center = area_center(screen, area)
 
-	# Create the property if it doesn't exist
-	if not hasattr(context.window_manager, full_prop_name):
-		setattr(bpy.types.WindowManager, full_prop_name, bpy.props.BoolProperty(default=False))
+	setattr(settings, prop_name, value)
+	anchor_area_settings([screen])
 
-	setattr(context.window_manager, full_prop_name, value)
+def prune_area_settings(screen):
+	"""Remove stored settings of 3D viewports that no longer exist on the screen"""
+	used = set(area_matches(screen).values())
+	for index in reversed(range(len(screen.dof_viz_areas))):
+		if index not in used:
+			screen.dof_viz_areas.remove(index)
+	_area_matches.pop(screen.as_pointer(), None)
+
+def any_area_enabled(screens, names=AREA_SETTINGS):
+	"""Whether any stored area of `screens` has one of the `names` settings on (cheap, no area matching)"""
+	return any(
+		getattr(item, name)
+		for screen in screens
+		for item in screen.dof_viz_areas
+		for name in names
+	)
+
+
+#############################################################
+# 
+# Focus Analysis Report
+# Per-object results of the focus analysis, stored on the
+# scene and listed in the sidebar panel
+# 
+#############################################################
+
+class DoFVizReportItem(bpy.types.PropertyGroup):
+	"""Frames spent by one object in each focus class"""
+	near_frames: bpy.props.IntProperty(name="Near Blur")
+	focus_frames: bpy.props.IntProperty(name="In Focus")
+	far_frames: bpy.props.IntProperty(name="Far Blur")
+	straddle_frames: bpy.props.IntProperty(name="Straddling")
+	behind_frames: bpy.props.IntProperty(name="Behind Camera")
+
+class DoFVizReport(bpy.types.PropertyGroup):
+	"""Focus analysis results for a camera and frame range"""
+	items: bpy.props.CollectionProperty(type=DoFVizReportItem)
+	active_index: bpy.props.IntProperty()
+	camera: bpy.props.StringProperty()
+	frame_start: bpy.props.IntProperty()
+	frame_end: bpy.props.IntProperty()
+	sort_key: bpy.props.EnumProperty(
+		name="Sort By",
+		items=[
+			('NAME', "Name", "Sort by object name"),
+			('OUT_OF_FOCUS', "Out of Focus", "Sort by frames fully blurred (near or far)"),
+			('NEAR', "Near Blur", "Sort by frames in front of the near limit"),
+			('FAR', "Far Blur", "Sort by frames beyond the far limit"),
+			('STRADDLE', "Straddling", "Sort by frames crossing a DoF limit"),
+			('FOCUS', "In Focus", "Sort by frames fully in focus"),
+		],
+		default='OUT_OF_FOCUS',
+	)
+	sort_reverse: bpy.props.BoolProperty(name="Descending", default=True)
+
+
+#############################################################
+# 
+# Overlay Scope
+# Per-scene filters limiting which meshes get overlay
+# batches, see scope.py
+# 
+#############################################################
+
+class DoFVizScopeCollection(bpy.types.PropertyGroup):
+	"""A collection included in or excluded from the overlay"""
+	collection: bpy.props.PointerProperty(type=bpy.types.Collection, name="Collection")
+
+class DoFVizScope(bpy.types.PropertyGroup):
+	"""Limits the overlay to the objects the shot actually sees"""
+	collection_mode: bpy.props.EnumProperty(
+		name="Collections",
+		items=[
+			('ALL', "All", "Don't filter by collection"),
+			('INCLUDE', "Include", "Only objects in the listed collections"),
+			('EXCLUDE', "Exclude", "Skip objects in the listed collections"),
+		],
+		default='ALL',
+	)
+	collections: bpy.props.CollectionProperty(type=DoFVizScopeCollection)
+	active_index: bpy.props.IntProperty()
+	use_frustum: bpy.props.BoolProperty(
+		name="Camera Frustum Only",
+		description="Only objects inside the scene camera's view",
+		default=False,
+	)
+	frustum_margin: bpy.props.FloatProperty(
+		name="Margin",
+		description="Extra margin around the camera frame, as a fraction of its size",
+		default=0.1, min=0.0, soft_max=1.0, subtype='FACTOR',
+	)
+	use_max_distance: bpy.props.BoolProperty(
+		name="Max Distance",
+		description="Only objects within a distance of the scene camera",
+		default=False,
+	)
+	max_distance: bpy.props.FloatProperty(
+		name="Distance",
+		description="Maximum distance from the scene camera to an object's bounding box",
+		default=100.0, min=0.0, subtype='DISTANCE',
+	)
+
+
+#############################################################
+# 
+# Focus Measurement
+# How the focus object distance is measured, see focus.py
+# 
+#############################################################
+
+class DoFVizFocus(bpy.types.PropertyGroup):
+	"""Where the distance to the camera's focus object is measured"""
+	mode: bpy.props.EnumProperty(
+		name="Measure To",
+		items=[
+			('ORIGIN', "Origin", "Distance to the focus object's origin, like Blender"),
+			('VIEW_AXIS', "Surface (View Axis)", "Nearest surface of the focus object along the camera's view axis"),
+			('SCREEN_POINT', "Surface (Screen Point)", "Surface of the focus object seen through a point of the camera frame"),
+		],
+		default='ORIGIN',
+	)
+	screen_point: bpy.props.FloatVectorProperty(
+		name="Screen Point",
+		description="Point of the camera frame, from bottom-left (0, 0) to top-right (1, 1)",
+		size=2, default=(0.5, 0.5), min=0.0, max=1.0,
+	)
 
 
 #############################################################
@@ -69,6 +319,9 @@ COLORBLIND_COLORS = {
 	'focal_plane': (1.0, 1.0, 1.0, 0.9) # white
 }
 
+def update_profiler_enabled(self, context):
+	profiler.set_enabled(self.enable_profiler)
+
 class DoFVisualizerPreferences(bpy.types.AddonPreferences):
 	"""
 	Addon preferences for DoF Visualizer color customization.
@@ -104,6 +357,14 @@ class DoFVisualizerPreferences(bpy.types.AddonPreferences):
 		name="Focal Plane", subtype='COLOR_GAMMA', size=4, default=DEFAULT_COLORS['focal_plane'], min=0.0, max=1.0
 	)
 
+	# Developer options
+	enable_profiler: bpy.props.BoolProperty(
+		name="Enable Profiler",
+		description="Record per-stage timings of the overlay and show them in the Text Info overlay",
+		default=False,
+		update=update_profiler_enabled,
+	)
+
 	def draw(self, context):
 		layout = self.layout
 
@@ -124,6 +385,20 @@ class DoFVisualizerPreferences(bpy.types.AddonPreferences):
 			col.prop(self, "custom_far_max_color")
 			col.prop(self, "custom_focal_plane_color")
 
+		layout.separator()
+		layout.label(text="Developer")
+		row = layout.row()
+		row.prop(self, "enable_profiler")
+		sub = row.row()
+		sub.enabled = self.enable_profiler
+		sub.operator("dof_viz.export_profile", text="Export Profile", icon='EXPORT')
+
+		row = layout.row()
+		if depsgraph_trace.is_recording():
+			row.operator("dof_viz.stop_trace_recording", text="Stop Trace Recording", icon='PAUSE')
+		else:
+			row.operator("dof_viz.start_trace_recording", text="Record Depsgraph Trace", icon='REC')
+
 def get_color_values(color_type):
 	"""Get color values based on current mode"""
 	addon_prefs = bpy.context.preferences.addons[__package__].preferences
@@ -0,0 +1,171 @@
+import numpy as np
+
+#############################################################
+#
+# Ray Clusters
+# Vectorized ray casting for the offline CoC maps. Triangles
+# are sorted along a Morton curve into small clusters with
+# bounding boxes, so a whole tile of rays is tested against
+# cluster bounds, then against the triangles of the clusters
+# it enters, in a few NumPy calls instead of a Python loop
+# per pixel. NumPy releases the GIL on these arrays, so tiles
+# traced on worker threads run in parallel.
+#
+#############################################################
+
+CLUSTER_SIZE = 32           # Triangles per cluster
+GROUP_SIZE = 32             # Clusters per group
+MAX_GROUP_PAIRS = 512      # (ray, group) pairs whose clusters are tested per chunk
+MAX_PAIRS = 2048            # (ray, cluster) pairs intersected per chunk
+
+def morton_codes(points):
+	"""30-bit Morton codes of (N, 3) points quantized to their bounds"""
+	low = points.min(axis=0)
+	extent = np.maximum(points.max(axis=0) - low, 1e-12)
+	cells = ((points - low) / extent * 1023.0).astype(np.uint32)
+	codes = np.zeros(len(points), dtype=np.uint32)
+	for bit in range(10):
+		for axis in range(3):
+			codes |= ((cells[:, axis] >> bit) & 1) << (3 * bit + axis)
+	return codes
+
+def build_clusters(positions, triangles):
+	"""
+	Two-level clustered triangle mesh of (V, 3) positions and (T, 3) triangle indices:
+	per-cluster first vertices and edges (C, CLUSTER_SIZE, 3), cluster bounds per group
+	(G, GROUP_SIZE, 3) and group bounds (G, 3). The last cluster is padded with degenerate
+	triangles, the last group with empty (NaN) bounds; rays never hit either.
+	"""
+
+	corners = positions[triangles].astype(np.float32)
+	corners = corners[np.argsort(morton_codes(corners.mean(axis=1)), kind='stable')]
+
+	count = len(corners)
+	clusters = -(-count // CLUSTER_SIZE)
+	groups = -(-clusters // GROUP_SIZE)
+
+	v0, e1, e2 = (np.zeros((clusters * CLUSTER_SIZE, 3), dtype=np.float32) for _ in range(3))
+	v0[:count] = corners[:, 0]
+	e1[:count] = corners[:, 1] - corners[:, 0]
+	e2[:count] = corners[:, 2] - corners[:, 0]
+
+	low = np.full((clusters * CLUSTER_SIZE, 3), np.inf, dtype=np.float32)
+	high = np.full((clusters * CLUSTER_SIZE, 3), -np.inf, dtype=np.float32)
+	low[:count] = corners.min(axis=1)
+	high[:count] = corners.max(axis=1)
+
+	cluster_low = np.full((groups * GROUP_SIZE, 3), np.nan, dtype=np.float32)
+	cluster_high = np.full((groups * GROUP_SIZE, 3), np.nan, dtype=np.float32)
+	cluster_low[:clusters] = low.reshape(clusters, CLUSTER_SIZE, 3).min(axis=1)
+	cluster_high[:clusters] = high.reshape(clusters, CLUSTER_SIZE, 3).max(axis=1)
+	cluster_low = cluster_low.reshape(groups, GROUP_SIZE, 3)
+	cluster_high = cluster_high.reshape(groups, GROUP_SIZE, 3)
+
+	# Triangles as (C, 3, CLUSTER_SIZE): contiguous components for intersect
+	mesh = {
+		"v0": v0.reshape(clusters, CLUSTER_SIZE, 3).transpose(0, 2, 1).copy(),
+		"e1": e1.reshape(clusters, CLUSTER_SIZE, 3).transpose(0, 2, 1).copy(),
+		"e2": e2.reshape(clusters, CLUSTER_SIZE, 3).transpose(0, 2, 1).copy(),
+		"cluster_low": cluster_low,
+		"cluster_high": cluster_high,
+		"low": np.fmin.reduce(cluster_low, axis=1),
+		"high": np.fmax.reduce(cluster_high, axis=1),
+	}
+	mesh["nbytes"] = sum(array.nbytes for array in mesh.values())
+	return mesh
+
+def bounds(mesh):
+	"""Bounds of the whole clustered mesh"""
+	return mesh["low"].min(axis=0), mesh["high"].max(axis=0)
+
+def box_entries(origins, inverse_directions, low, high):
+	"""
+	Slab test of rays against boxes, broadcast over leading axes: distance along each ray
+	to where it enters each box, inf on a miss or for empty (NaN) boxes.
+	"""
+	t0 = (low - origins) * inverse_directions
+	t1 = (high - origins) * inverse_directions
+	near = np.minimum(t0, t1)
+	far = np.maximum(t0, t1)
+	# Explicit per-axis reductions, much faster than reducing a length 3 axis
+	t_near = np.maximum(np.maximum(near[..., 0], near[..., 1]), np.maximum(near[..., 2], 0.0))
+	t_far = np.minimum(np.minimum(far[..., 0], far[..., 1]), far[..., 2])
+	return np.where(t_far >= t_near, t_near, np.inf)
+
+def cross(a, b):
+	"""Cross products of vectors stored as (x, y, z) component arrays"""
+	return (
+		a[1] * b[2] - a[2] * b[1],
+		a[2] * b[0] - a[0] * b[2],
+		a[0] * b[1] - a[1] * b[0],
+	)
+
+def dot(a, b):
+	return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+def intersect(origins, directions, v0, e1, e2):
+	"""
+	Möller-Trumbore distances from rays (P, 3) to the triangles of one cluster each
+	(P, 3, S), in units of the direction vectors; shape (P, S), inf on a miss.
+	"""
+	# Component arrays broadcast to (P, S): per-axis arithmetic beats einsum over length 3 axes
+	direction = [directions[:, axis, None] for axis in range(3)]
+	v0, e1, e2 = ([vectors[:, axis] for axis in range(3)] for vectors in (v0, e1, e2))
+
+	pvec = cross(direction, e2)
+	det = dot(e1, pvec)
+	inverse_det = np.divide(1.0, det, out=np.zeros_like(det), where=det != 0.0)
+	tvec = [origins[:, axis, None] - v0[axis] for axis in range(3)]
+	u = dot(tvec, pvec) * inverse_det
+	qvec = cross(tvec, e1)
+	v = dot(direction, qvec) * inverse_det
+	t = dot(e2, qvec) * inverse_det
+	hit = (det != 0.0) & (u >= 0.0) & (v >= 0.0) & (u + v <= 1.0) & (t > 1e-6)
+	return np.where(hit, t, np.inf)
+
+def nearest_first(rays, boxes, entries):
+	"""(ray, box) pairs and their entry distances, sorted by entry distance"""
+	order = np.argsort(entries, kind='stable')
+	return rays[order], boxes[order], entries[order]
+
+def cast(mesh, origins, directions, closest):
+	"""
+	Lower `closest` (R,) in place to the distance of each ray's first hit on the clustered
+	mesh, in units of the direction vectors. Pairs of rays and boxes are visited nearest
+	first, so boxes behind a hit found earlier are skipped.
+	"""
+
+	origins = origins.astype(np.float32)
+	directions = directions.astype(np.float32)
+	# Axis-parallel rays: a tiny component keeps the slab distances finite
+	inverse_directions = 1.0 / np.where(directions == 0.0, np.float32(1e-30), directions)
+
+	with np.errstate(invalid='ignore', over='ignore'):
+		entries = box_entries(origins[:, None], inverse_directions[:, None], mesh["low"][None], mesh["high"][None])
+		rays, groups = np.nonzero(entries < closest[:, None])
+		rays, groups, group_entries = nearest_first(rays, groups, entries[rays, groups])
+
+		for start in range(0, len(rays), MAX_GROUP_PAIRS):
+			group_rays = rays[start:start + MAX_GROUP_PAIRS]
+			group = groups[start:start + MAX_GROUP_PAIRS]
+			visible = group_entries[start:start + MAX_GROUP_PAIRS] < closest[group_rays]
+			group_rays, group = group_rays[visible], group[visible]
+			entries = box_entries(
+				origins[group_rays, None], inverse_directions[group_rays, None],
+				mesh["cluster_low"][group], mesh["cluster_high"][group],
+			)
+			pair, slot = np.nonzero(entries < closest[group_rays, None])
+			cluster_rays, clusters, cluster_entries = nearest_first(
+				group_rays[pair], group[pair] * GROUP_SIZE + slot, entries[pair, slot])
+
+			for chunk in range(0, len(cluster_rays), MAX_PAIRS):
+				ray = cluster_rays[chunk:chunk + MAX_PAIRS]
+				cluster = clusters[chunk:chunk + MAX_PAIRS]
+				visible = cluster_entries[chunk:chunk + MAX_PAIRS] < closest[ray]
+				ray, cluster = ray[visible], cluster[visible]
+				distances = intersect(
+					origins[ray], directions[ray],
+					mesh["v0"][cluster], mesh["e1"][cluster], mesh["e2"][cluster],
+				).min(axis=1)
+				np.minimum.at(closest, ray, distances)
+	return closest
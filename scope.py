@@ -0,0 +1,144 @@
+import numpy as np
+
+#############################################################
+#
+# Overlay Scope
+# Per-scene filters limiting which meshes get overlay batches:
+# collections to include or exclude, the scene camera frustum
+# (with a margin) and a maximum distance from the camera.
+# Bounding boxes are tested for all objects at once with NumPy,
+# and results are cached so updates only retest the objects
+# they touch while the camera and the settings stay put.
+#
+#############################################################
+
+def frustum_planes(scene, camera, margin=0.0):
+	"""
+	Camera-space planes (a, b, c, d) of the scene camera frustum, inside where a*x + b*y + c*z + d <= 0.
+	The frame is grown by `margin` (a fraction of its size) on every side.
+	"""
+
+	frame = np.array([tuple(corner) for corner in camera.data.view_frame(scene=scene)])
+	if camera.data.type == 'ORTHO':
+		xs, ys = frame[:, 0], frame[:, 1]
+	else:
+		xs, ys = frame[:, 0] / -frame[:, 2], frame[:, 1] / -frame[:, 2]
+
+	x_min, x_max = xs.min(), xs.max()
+	y_min, y_max = ys.min(), ys.max()
+	x_pad = (x_max - x_min) * 0.5 * margin
+	y_pad = (y_max - y_min) * 0.5 * margin
+	x_min, x_max = x_min - x_pad, x_max + x_pad
+	y_min, y_max = y_min - y_pad, y_max + y_pad
+
+	if camera.data.type == 'ORTHO':
+		sides = [(1, 0, 0, -x_max), (-1, 0, 0, x_min), (0, 1, 0, -y_max), (0, -1, 0, y_min)]
+	else:
+		sides = [(1, 0, x_max, 0), (-1, 0, -x_min, 0), (0, 1, y_max, 0), (0, -1, -y_min, 0)]
+
+	# Everything behind the camera is out
+	return np.array(sides + [(0, 0, 1, 0)], dtype=np.float64)
+
+def world_corners(objects):
+	"""World-space bounding box corners of `objects`, shape (O, 8, 3)"""
+	local = np.ones((len(objects), 8, 4))
+	matrices = np.empty((len(objects), 4, 4))
+	for i, obj in enumerate(objects):
+		local[i, :, :3] = obj.bound_box
+		matrices[i] = obj.matrix_world
+	return np.einsum('ojk,ock->ocj', matrices, local)[..., :3]
+
+def in_frustum(corners, view_matrix, planes):
+	"""Boxes not entirely outside any frustum plane (conservative), shape (O,)"""
+	camera_corners = corners @ view_matrix[:3, :3].T + view_matrix[:3, 3]
+	distances = camera_corners @ planes[:, :3].T + planes[:, 3]
+	return ~(distances > 0.0).all(axis=1).any(axis=1)
+
+def within_distance(corners, location, max_distance):
+	"""Boxes whose closest point is at most `max_distance` from `location`, shape (O,)"""
+	closest = np.clip(location, corners.min(axis=1), corners.max(axis=1))
+	return np.linalg.norm(closest - location, axis=1) <= max_distance
+
+def collection_members(collections):
+	"""Names of all objects in `collections`, including their child collections"""
+	names = set()
+	for item in collections:
+		if item.collection is not None:
+			names.update(obj.name for obj in item.collection.all_objects)
+	return names
+
+def filter_objects(scene, objects):
+	"""The objects of `objects` inside the scene's overlay scope"""
+
+	objects = list(objects)
+	# Scope settings are absent when the add-on isn't registered (e.g. benchmarks)
+	settings = getattr(scene, "dof_viz_scope", None)
+	if settings is None or not objects:
+		return objects
+
+	if settings.collection_mode != 'ALL':
+		members = collection_members(settings.collections)
+		include = settings.collection_mode == 'INCLUDE'
+		objects = [obj for obj in objects if (obj.name in members) == include]
+
+	camera = scene.camera
+	if not objects or camera is None or not (settings.use_frustum or settings.use_max_distance):
+		return objects
+
+	corners = world_corners(objects)
+	keep = np.ones(len(objects), dtype=bool)
+	if settings.use_frustum and camera.type == 'CAMERA':
+		view_matrix = np.array(camera.matrix_world.inverted())
+		keep &= in_frustum(corners, view_matrix, frustum_planes(scene, camera, settings.frustum_margin))
+	if settings.use_max_distance:
+		keep &= within_distance(corners, np.array(camera.matrix_world.translation), settings.max_distance)
+
+	return [obj for obj, inside in zip(objects, keep) if inside]
+
+def scope_signature(scene):
+	"""What scope results depend on besides the objects: the settings and the scene camera's view"""
+	settings = getattr(scene, "dof_viz_scope", None)
+	if settings is None:
+		return None
+
+	camera = scene.camera
+	view = None
+	if camera is not None:
+		frame = tuple(tuple(corner) for corner in camera.data.view_frame(scene=scene)) if camera.type == 'CAMERA' else None
+		view = (camera.name, tuple(tuple(row) for row in camera.matrix_world), frame)
+
+	collections = tuple(item.collection.name for item in settings.collections if item.collection is not None)
+	return (
+		settings.collection_mode, collections,
+		settings.use_frustum, settings.frustum_margin,
+		settings.use_max_distance, settings.max_distance,
+		view,
+	)
+
+def filter_names(scene, objects, cache, updated=None):
+	"""
+	Names of the objects of `objects` inside the scene's overlay scope, like filter_objects.
+	Results are kept in the dict `cache`: while the scope signature is unchanged, only
+	objects not tested before and those named in `updated` are tested again. With `updated`
+	None (e.g. collection membership changed) every object is.
+	"""
+
+	objects = {obj.name: obj for obj in objects}
+	signature = scope_signature(scene)
+	if updated is None or cache.get("signature") != signature:
+		cache["signature"] = signature
+		cache["inside"] = {}
+		updated = ()
+
+	# object name -> whether it was inside when last tested
+	results = cache["inside"]
+	for name in [name for name in results if name not in objects]:
+		del results[name]
+
+	retest = [obj for name, obj in objects.items() if name not in results or name in updated]
+	if retest:
+		inside = {obj.name for obj in filter_objects(scene, retest)}
+		for obj in retest:
+			results[obj.name] = obj.name in inside
+
+	return {name for name, inside in results.items() if inside}
@@ -0,0 +1,24 @@
+"""
+Load the bpy-free core modules of the addon (change detection, cache bookkeeping,
+trace snapshots, scope, CoC ray casting) without Blender, as tools/replay_trace.py does.
+"""
+
+import os
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), "tools"))
+
+import bpy_standin
+import replay_trace
+
+
+@pytest.fixture(scope="session")
+def core():
+	return replay_trace.load_core()
+
+@pytest.fixture
+def standin():
+	return bpy_standin
@@ -0,0 +1,52 @@
+"""Per-scene batch caches: switching, the stash budget and pruning"""
+
+import pytest
+
+
+@pytest.fixture
+def state(core):
+	state = {"cache_stats": core.batch_cache.new_stats()}
+	state.update(core.batch_cache.new_scene_cache())
+	return state
+
+def fill(core, state, key, names, nbytes=1):
+	core.batch_cache.select_scene(state, key)
+	for name in names:
+		core.batch_cache.store_batch(state, name, {"nbytes": nbytes, "data": name})
+
+
+def test_switching_back_reuses_batches(core, state):
+	fill(core, state, (1, "ViewLayer"), ["Cube"])
+	fill(core, state, (2, "ViewLayer"), ["Sphere"])
+	core.batch_cache.select_scene(state, (1, "ViewLayer"))
+
+	assert set(state["mesh_batches"]) == {"Cube"}
+	assert set(core.batch_cache.get_scene_batches(state, (2, "ViewLayer"))) == {"Sphere"}
+
+def test_stash_drops_least_recently_used_over_budget(core, state):
+	fill(core, state, (1, "ViewLayer"), ["Cube"], nbytes=60)
+	fill(core, state, (2, "ViewLayer"), ["Sphere"], nbytes=60)
+	fill(core, state, (3, "ViewLayer"), ["Cone"], nbytes=60)
+	core.batch_cache.trim_scene_caches(state, budget=100)
+
+	assert core.batch_cache.scene_cache(state, (1, "ViewLayer")) is None
+	assert core.batch_cache.scene_cache(state, (2, "ViewLayer")) is not None
+	assert set(state["mesh_batches"]) == {"Cone"}
+
+def test_prune_keeps_existing_and_drops_deleted_scenes(core, state):
+	fill(core, state, (1, "ViewLayer"), ["Cube"])
+	fill(core, state, (2, "ViewLayer"), ["Sphere"])
+	core.batch_cache.prune_scenes(state, [(2, "ViewLayer"), (3, "ViewLayer")])
+
+	assert core.batch_cache.scene_cache(state, (1, "ViewLayer")) is None
+	assert set(state["mesh_batches"]) == {"Sphere"}
+	assert state["cache_stats"]["evictions"] == 1
+
+def test_renamed_view_layer_keeps_its_cache(core, state):
+	fill(core, state, (1, "ViewLayer"), ["Cube"])
+	fill(core, state, (1, "Lighting"), ["Sphere"])
+	core.batch_cache.prune_scenes(state, [(1, "ViewLayer"), (1, "Lighting.001")])
+
+	assert state["scene_key"] == (1, "Lighting.001")
+	assert set(state["mesh_batches"]) == {"Sphere"}
+	assert set(core.batch_cache.get_scene_batches(state, (1, "ViewLayer"))) == {"Cube"}
@@ -0,0 +1,125 @@
+"""Depsgraph change detection driven with bpy stand-in updates"""
+
+import pytest
+
+
+class Scene:
+	"""Visible meshes, their mesh data and the camera, with the batch work of each update"""
+
+	def __init__(self, core, standin, meshes, camera="Camera"):
+		self.core = core
+		self.standin = standin
+		self.meshes = dict(meshes)  # object name -> mesh name
+		self.visible = set(self.meshes)
+		self.camera = camera
+		self.state = {"mesh_batches": {}, "cache_stats": core.batch_cache.new_stats()}
+		self.built = []
+		self.full_rebuilds = 0
+		self.rebuild_all()
+		self.built.clear()
+		self.full_rebuilds = 0
+
+	def build(self, names):
+		for name in names:
+			if name in self.visible:
+				self.built.append(name)
+				self.core.batch_cache.store_batch(self.state, name, {"nbytes": 0, "data": self.meshes[name]})
+
+	def rebuild_all(self):
+		self.full_rebuilds += 1
+		self.core.batch_cache.clear(self.state)
+		self.build(self.visible)
+		self.state["cached_visible_meshes"] = set(self.visible)
+		self.state["current_camera"] = self.camera
+
+	def update(self, *updates):
+		"""Run one handler call for (ID type, name, flags) updates"""
+		depsgraph = self.standin.Depsgraph([
+			self.standin.DepsgraphUpdate(
+				self.standin.ID(name, id_type) if id_type is not None else None,
+				is_updated_geometry="geometry" in flags,
+				is_updated_transform="transform" in flags,
+			)
+			for id_type, name, flags in updates
+		])
+		records = self.core.depsgraph_trace.snapshot_updates(depsgraph.updates)
+		return self.core.change_detection.process_update(
+			self.state, records,
+			lambda: set(self.visible),
+			lambda: self.camera,
+			self.rebuild_all,
+			self.build,
+		)
+
+
+@pytest.fixture
+def scene(core, standin):
+	return Scene(core, standin, {"Cube": "CubeMesh", "Cube.001": "CubeMesh", "Sphere": "SphereMesh"})
+
+
+def test_transform_only_update_is_idle(scene):
+	changed = scene.update(('Object', "Cube", {"transform"}))
+
+	assert not changed
+	assert scene.built == []
+	assert scene.full_rebuilds == 0
+	assert scene.state["cache_stats"]["idle_updates"] == 1
+
+def test_object_geometry_update_rebuilds_that_object(scene):
+	changed = scene.update(('Object', "Sphere", {"geometry", "transform"}))
+
+	assert changed
+	assert scene.built == ["Sphere"]
+	assert scene.full_rebuilds == 0
+
+def test_mesh_geometry_update_rebuilds_its_users(scene):
+	changed = scene.update(('Mesh', "CubeMesh", {"geometry"}))
+
+	assert changed
+	assert sorted(scene.built) == ["Cube", "Cube.001"]
+	assert scene.full_rebuilds == 0
+
+def test_unused_mesh_update_builds_nothing(scene):
+	scene.update(('Mesh', "OtherMesh", {"geometry"}))
+
+	assert scene.built == []
+	assert scene.full_rebuilds == 0
+
+def test_hidden_object_is_evicted(scene):
+	scene.visible.discard("Sphere")
+	changed = scene.update(('Object', "Sphere", set()))
+
+	assert changed
+	assert "Sphere" not in scene.state["mesh_batches"]
+	assert scene.state["cached_visible_meshes"] == {"Cube", "Cube.001"}
+	assert scene.state["cache_stats"]["evictions"] == 1
+
+def test_edited_object_leaving_the_scope_is_evicted(scene):
+	scene.visible.discard("Sphere")
+	changed = scene.update(('Object', "Sphere", {"geometry", "transform"}))
+
+	assert changed
+	assert scene.built == []
+	assert "Sphere" not in scene.state["mesh_batches"]
+	assert scene.state["cached_visible_meshes"] == {"Cube", "Cube.001"}
+
+def test_shown_object_is_built(scene):
+	scene.meshes["Cone"] = "ConeMesh"
+	scene.visible.add("Cone")
+	scene.update(('Object', "Cone", set()))
+
+	assert scene.built == ["Cone"]
+	assert "Cone" in scene.state["mesh_batches"]
+
+def test_camera_change_rebuilds_everything(scene):
+	scene.camera = "Camera.001"
+	scene.update(('Scene', "Scene", set()))
+
+	assert scene.full_rebuilds == 1
+
+def test_unknown_geometry_update_rebuilds_everything(scene):
+	changed = scene.update(('Object', None, {"geometry"}))
+
+	assert changed
+	assert scene.full_rebuilds == 1
+	assert scene.state["cache_stats"]["full_rebuilds"] == 1
@@ -0,0 +1,81 @@
+"""Vectorized ray casting of the CoC maps against brute force and analytic hits"""
+
+import numpy as np
+import pytest
+
+
+def grid(size, z=0.0):
+	"""(size x size) quad grid on the unit square at height z, as positions and triangles"""
+	u = np.linspace(0.0, 1.0, size + 1)
+	xx, yy = np.meshgrid(u, u)
+	positions = np.stack([xx.ravel(), yy.ravel(), np.full(xx.size, z)], axis=1)
+	index = np.arange((size + 1) ** 2).reshape(size + 1, size + 1)
+	a, b, c, d = index[:-1, :-1].ravel(), index[:-1, 1:].ravel(), index[1:, 1:].ravel(), index[1:, :-1].ravel()
+	triangles = np.concatenate([np.stack([a, b, c], axis=1), np.stack([a, c, d], axis=1)])
+	return positions, triangles
+
+def sphere(size):
+	theta, phi = np.meshgrid(np.linspace(0.0, np.pi, size), np.linspace(0.0, 2.0 * np.pi, size), indexing='ij')
+	positions = np.stack([np.sin(theta) * np.cos(phi), np.sin(theta) * np.sin(phi), np.cos(theta)], axis=-1).reshape(-1, 3)
+	index = np.arange(size * size).reshape(size, size)
+	a, b, c, d = index[:-1, :-1].ravel(), index[1:, :-1].ravel(), index[1:, 1:].ravel(), index[:-1, 1:].ravel()
+	return positions, np.concatenate([np.stack([a, b, c], axis=1), np.stack([a, c, d], axis=1)])
+
+def cast(core, positions, triangles, origins, directions):
+	mesh = core.ray_clusters.build_clusters(positions, triangles)
+	return core.ray_clusters.cast(mesh, origins, directions, np.full(len(origins), np.inf))
+
+
+def test_sphere_hits_match_analytic_distances(core):
+	rng = np.random.default_rng(0)
+	directions = np.column_stack([rng.uniform(-0.3, 0.3, (500, 2)), -np.ones(500)])
+	directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+	origins = np.tile((0.0, 0.0, 5.0), (500, 1))
+
+	closest = cast(core, *sphere(200), origins, directions)
+
+	b = np.einsum('ij,ij->i', origins, directions)
+	discriminant = b * b - (np.einsum('ij,ij->i', origins, origins) - 1.0)
+	# Rays grazing the silhouette may miss the tessellated sphere
+	clear_hit = discriminant > 0.01
+	clear_miss = discriminant < -0.01
+	assert np.allclose(closest[clear_hit], -b[clear_hit] - np.sqrt(discriminant[clear_hit]), atol=5e-3)
+	assert np.all(np.isinf(closest[clear_miss]))
+
+def test_nearest_of_stacked_layers_is_hit(core):
+	near, near_triangles = grid(40, z=1.0)
+	far, far_triangles = grid(40, z=0.0)
+	positions = np.concatenate([far, near])
+	triangles = np.concatenate([far_triangles, near_triangles + len(far)])
+	origins = np.column_stack([np.random.default_rng(1).uniform(0.01, 0.99, (200, 2)), np.full(200, 3.0)])
+	directions = np.tile((0.0, 0.0, -1.0), (200, 1))
+
+	closest = cast(core, positions, triangles, origins, directions)
+
+	assert np.allclose(closest, 2.0)
+
+def test_existing_closer_hits_are_kept(core):
+	origins = np.array([[0.5, 0.5, 3.0], [0.5, 0.5, 3.0]])
+	directions = np.array([[0.0, 0.0, -1.0], [0.0, 0.0, -1.0]])
+	mesh = core.ray_clusters.build_clusters(*grid(4))
+
+	closest = core.ray_clusters.cast(mesh, origins, directions, np.array([1.5, np.inf]))
+
+	assert closest.tolist() == pytest.approx([1.5, 3.0])
+
+def test_distances_are_in_direction_units(core):
+	# Scaled directions (object space of a scaled object) scale the distances
+	origins = np.array([[0.25, 0.75, 2.0]])
+	directions = np.array([[0.0, 0.0, -0.5]])
+
+	closest = cast(core, *grid(3), origins, directions)
+
+	assert closest[0] == pytest.approx(4.0)
+
+def test_rays_missing_or_parallel_to_the_mesh_miss(core):
+	origins = np.array([[2.0, 2.0, 1.0], [0.5, 0.5, 1.0], [-1.0, 0.5, 0.0]])
+	directions = np.array([[0.0, 0.0, -1.0], [0.0, 0.0, 1.0], [1.0, 0.0, 0.0]])
+
+	closest = cast(core, *grid(3), origins, directions)
+
+	assert np.all(np.isinf(closest))
@@ -0,0 +1,81 @@
+"""Incremental overlay scope tests: only updated objects are tested again"""
+
+import types
+
+import pytest
+
+
+def mesh(name):
+	return types.SimpleNamespace(name=name)
+
+def collection(*objects):
+	return types.SimpleNamespace(collection=types.SimpleNamespace(name="Set", all_objects=list(objects)))
+
+@pytest.fixture
+def scene():
+	"""Scene without camera, so only the collection filter applies"""
+	settings = types.SimpleNamespace(
+		collection_mode='ALL', collections=[],
+		use_frustum=False, frustum_margin=0.1,
+		use_max_distance=False, max_distance=10.0,
+	)
+	return types.SimpleNamespace(camera=None, dof_viz_scope=settings)
+
+@pytest.fixture
+def tested(core, monkeypatch):
+	"""Names passed to the full scope test, per call"""
+	calls = []
+	filter_objects = core.scope.filter_objects
+
+	def recording(scene, objects):
+		objects = list(objects)
+		calls.append(sorted(obj.name for obj in objects))
+		return filter_objects(scene, objects)
+
+	monkeypatch.setattr(core.scope, "filter_objects", recording)
+	return calls
+
+
+def test_unchanged_scope_tests_only_updated_objects(core, scene, tested):
+	objects = [mesh("Near"), mesh("Far"), mesh("Prop")]
+	scene.dof_viz_scope.collection_mode = 'INCLUDE'
+	scene.dof_viz_scope.collections = [collection(objects[0], objects[2])]
+	cache = {}
+
+	assert core.scope.filter_names(scene, objects, cache) == {"Near", "Prop"}
+	assert core.scope.filter_names(scene, objects, cache, updated={"Prop"}) == {"Near", "Prop"}
+	assert core.scope.filter_names(scene, objects, cache, updated=set()) == {"Near", "Prop"}
+
+	assert tested == [["Far", "Near", "Prop"], ["Prop"]]
+
+def test_new_objects_are_tested_and_removed_ones_forgotten(core, scene, tested):
+	objects = [mesh("Near"), mesh("Far")]
+	cache = {}
+	core.scope.filter_names(scene, objects, cache)
+
+	names = core.scope.filter_names(scene, [objects[0], mesh("New")], cache, updated=set())
+
+	assert names == {"Near", "New"}
+	assert tested[-1] == ["New"]
+	assert set(cache["inside"]) == {"Near", "New"}
+
+def test_settings_change_retests_everything(core, scene, tested):
+	objects = [mesh("Near"), mesh("Far")]
+	cache = {}
+	core.scope.filter_names(scene, objects, cache)
+
+	scene.dof_viz_scope.collection_mode = 'EXCLUDE'
+	scene.dof_viz_scope.collections = [collection(objects[1])]
+	names = core.scope.filter_names(scene, objects, cache, updated=set())
+
+	assert names == {"Near"}
+	assert tested[-1] == ["Far", "Near"]
+
+def test_none_updated_retests_everything(core, scene, tested):
+	objects = [mesh("Near"), mesh("Far")]
+	cache = {}
+	core.scope.filter_names(scene, objects, cache)
+
+	core.scope.filter_names(scene, objects, cache, updated=None)
+
+	assert tested == [["Far", "Near"], ["Far", "Near"]]
@@ -0,0 +1,320 @@
+import csv
+
+import bpy
+import gpu
+import blf
+import numpy as np
+from gpu_extras.batch import batch_for_shader
+
+try:
+	from bpy_extras.anim_utils import action_get_channelbag_for_slot
+except ImportError:  # Blender < 4.4, actions without slots
+	action_get_channelbag_for_slot = None
+
+from .dof_math import solve_dof_arrays
+from .properties import get_color_values
+from . import focus, profiler
+
+#############################################################
+#
+# DoF Timeline
+# Samples the scene camera over the frame range in one pass,
+# solves the DoF equations for all frames at once and caches
+# the result for playback and the near/focus/far graph.
+#
+#############################################################
+
+def sample_camera(scene, camera, frames, on_frame=None):
+	"""
+	Sample lens, f-stop, sensor width, focus distance and view matrix of the camera for each frame.
+	Steps the scene through the frames once (restoring the current frame afterwards)
+	since focus objects and camera may be animated through constraints or parenting.
+	`on_frame(index, samples)` is called after each frame is sampled, to sample more data in the same pass.
+	"""
+
+	count = len(frames)
+	samples = {
+		"lens": np.empty(count),
+		"fstop": np.empty(count),
+		"sensor_width": np.empty(count),
+		"focus_distance": np.empty(count),
+		"view_matrix": np.empty((count, 4, 4)),
+		"focus_matrix": np.empty((count, 4, 4)),
+	}
+
+	cam_data = camera.data
+	focus_object = cam_data.dof.focus_object
+	original_frame = scene.frame_current
+	depsgraph = bpy.context.evaluated_depsgraph_get()
+	try:
+		for i, frame in enumerate(frames):
+			scene.frame_set(int(frame))
+			samples["lens"][i] = cam_data.lens
+			samples["fstop"][i] = cam_data.dof.aperture_fstop
+			samples["sensor_width"][i] = cam_data.sensor_width
+
+			# Deforming focus objects change between frames, so trees are looked up by content
+			cam_eval = camera.evaluated_get(depsgraph)
+			samples["focus_distance"][i] = focus.focus_distance(scene, cam_eval, depsgraph, cached=False)
+
+			samples["view_matrix"][i] = camera.matrix_world.inverted()
+			samples["focus_matrix"][i] = focus_object.matrix_world if focus_object else np.identity(4)
+			if on_frame is not None:
+				on_frame(i, samples)
+	finally:
+		scene.frame_set(original_frame)
+
+	return samples
+
+def frame_range(scene, frame_start=None, frame_end=None, frame_step=1):
+	frame_start = scene.frame_start if frame_start is None else frame_start
+	frame_end = scene.frame_end if frame_end is None else frame_end
+	return np.arange(frame_start, frame_end + 1, max(1, frame_step), dtype=np.int32)
+
+def sample_and_solve(scene, camera, frames, state, on_frame=None):
+	"""Sample the camera over `frames` and add the solved dof_near/dof_far/hyperfocal arrays"""
+
+	# Ignore the depsgraph updates caused by stepping through the frames
+	state["suspend_updates"] = True
+	try:
+		samples = sample_camera(scene, camera, frames, on_frame)
+	finally:
+		state["suspend_updates"] = False
+
+	samples["dof_near"], samples["dof_far"], samples["hyperfocal"] = solve_dof_arrays(
+		samples["lens"] / 1000.0,
+		samples["fstop"],
+		samples["sensor_width"] / 1000.0,
+		samples["focus_distance"],
+	)
+	return samples
+
+@profiler.profiled("precompute_timeline")
+def precompute(scene, camera, state, frame_start=None, frame_end=None, frame_step=1):
+	"""Sample and solve the DoF timeline of `camera`, storing it in state["timeline"]"""
+
+	frames = frame_range(scene, frame_start, frame_end, frame_step)
+	samples = sample_and_solve(scene, camera, frames, state)
+
+	state["timeline"] = {
+		"scene": scene.name,
+		"camera": camera.name,
+		"focus_settings": focus.settings_key(scene),
+		"fingerprint": animation_fingerprint(camera),
+		"frames": frames,
+		"focus_distance": samples["focus_distance"],
+		"dof_near": samples["dof_near"],
+		"dof_far": samples["dof_far"],
+		"hyperfocal": samples["hyperfocal"],
+		"fstop": samples["fstop"],
+		"lens": samples["lens"],
+		"sensor_width": samples["sensor_width"],
+		"camera_matrix": np.linalg.inv(samples["view_matrix"]),
+		"focus_matrix": samples["focus_matrix"],
+		"validated": None,  # frame the cache was last checked at, see get_valid_timeline
+	}
+	return state["timeline"]
+
+def watched_objects(camera):
+	"""The camera, its focus object and their parents, whose state sets the sampled values"""
+	objects = []
+	for obj in (camera, camera.data.dof.focus_object):
+		while obj is not None and obj not in objects:
+			objects.append(obj)
+			obj = obj.parent
+	return objects
+
+def action_fcurves(animation_data):
+	"""F-curves of the action of `animation_data`, through its slot on layered actions"""
+	action = animation_data.action if animation_data else None
+	if action is None:
+		return ()
+	if action_get_channelbag_for_slot is None:
+		return action.fcurves
+	channelbag = action_get_channelbag_for_slot(action, animation_data.action_slot)
+	return channelbag.fcurves if channelbag else ()
+
+def animation_fingerprint(camera):
+	"""Hashable summary of the focus object and of the keyframes of the camera, its data and watched objects"""
+	focus_object = camera.data.dof.focus_object
+	parts = [focus_object.name if focus_object else None]
+	for id_data in watched_objects(camera) + [camera.data]:
+		parts.append(id_data.name)
+		for fcurve in action_fcurves(id_data.animation_data):
+			values = np.empty((3, len(fcurve.keyframe_points) * 2))
+			for row, attribute in enumerate(("co", "handle_left", "handle_right")):
+				fcurve.keyframe_points.foreach_get(attribute, values[row])
+			parts.append((fcurve.data_path, fcurve.array_index, values.tobytes()))
+	return hash(tuple(parts))
+
+def frame_index(timeline, frame):
+	frames = timeline["frames"]
+	index = int(np.searchsorted(frames, frame))
+	if index >= len(frames) or frames[index] != frame:
+		return None
+	return index
+
+def frame_matches(timeline, index, camera):
+	"""Whether the camera evaluated at the current frame still matches the sample `index` of that frame"""
+	cam_data = camera.data
+	focus_object = cam_data.dof.focus_object
+	focus_matrix = np.array(focus_object.matrix_world) if focus_object else np.identity(4)
+	return (
+		np.isclose(timeline["lens"][index], cam_data.lens)
+		and np.isclose(timeline["fstop"][index], cam_data.dof.aperture_fstop)
+		and np.isclose(timeline["sensor_width"][index], cam_data.sensor_width)
+		and np.allclose(timeline["camera_matrix"][index], camera.matrix_world, atol=1e-5)
+		and np.allclose(timeline["focus_matrix"][index], focus_matrix, atol=1e-5)
+	)
+
+def get_valid_timeline(state, scene, camera, memoize=True):
+	"""
+	The timeline cache if it was computed for `camera` and still matches it, otherwise None.
+	Depsgraph updates aren't handled while the overlay is off, so the cache is checked here:
+	keyframe edits change the fingerprint, and other edits (f-stop, moved parents...) show up
+	as a mismatch with the sample of the current frame. With `memoize` (redraws), the check
+	runs once per frame; invalidate_on_updates makes the next redraw check again.
+	"""
+
+	timeline = state.get("timeline")
+	if not timeline or timeline["camera"] != camera.name or timeline["scene"] != scene.name:
+		return None
+	if memoize and timeline["validated"] == scene.frame_current:
+		return timeline
+	if timeline["focus_settings"] != focus.settings_key(scene) or timeline["fingerprint"] != animation_fingerprint(camera):
+		state["timeline"] = None
+		return None
+
+	index = frame_index(timeline, scene.frame_current)
+	if index is not None and not frame_matches(timeline, index, camera):
+		state["timeline"] = None
+		return None
+	timeline["validated"] = scene.frame_current
+	return timeline
+
+def get_cached_info(state, scene, camera, frame, memoize=True):
+	"""DoF info for a frame from the timeline cache, or None if not cached or stale"""
+	timeline = get_valid_timeline(state, scene, camera, memoize)
+	if timeline is None:
+		return None
+
+	index = frame_index(timeline, frame)
+	if index is None:
+		return None
+
+	return {
+		"focus_distance": float(timeline["focus_distance"][index]),
+		"dof_near": float(timeline["dof_near"][index]),
+		"dof_far": float(timeline["dof_far"][index]),
+		"hyperfocal": float(timeline["hyperfocal"][index]),
+	}
+
+def invalidate_on_updates(state, records, scene):
+	"""
+	Drop the timeline cache when an update can change the sampled values: camera data
+	or animation edits, or a manual move of an unanimated camera, focus object or parent.
+	Animated objects only move during playback or scrubbing, which doesn't invalidate.
+	"""
+
+	timeline = state.get("timeline")
+	if not timeline or timeline["scene"] != scene.name:
+		return
+	timeline["validated"] = None
+
+	camera = scene.objects.get(timeline["camera"])
+	if camera is None:
+		state["timeline"] = None
+		return
+
+	watched = {obj.name: obj for obj in watched_objects(camera)}
+
+	for record in records:
+		if record["type"] == 'Action' or (record["type"] == 'Camera' and record["name"] == camera.data.name):
+			state["timeline"] = None
+			return
+
+		obj = watched.get(record["name"]) if record["type"] == 'Object' else None
+		if obj is not None and record["transform"]:
+			animation_data = obj.animation_data
+			if not (animation_data and animation_data.action):
+				state["timeline"] = None
+				return
+
+def export_csv(timeline, filepath):
+	with open(filepath, "w", newline="", encoding="utf-8") as f:
+		writer = csv.writer(f)
+		writer.writerow(["frame", "focal_length_mm", "fstop", "focus_distance", "dof_near", "dof_far", "hyperfocal"])
+		for i, frame in enumerate(timeline["frames"]):
+			writer.writerow([
+				int(frame),
+				f"{timeline['lens'][i]:.4f}",
+				f"{timeline['fstop'][i]:.4f}",
+				f"{timeline['focus_distance'][i]:.6f}",
+				f"{timeline['dof_near'][i]:.6f}",
+				f"{timeline['dof_far'][i]:.6f}" if np.isfinite(timeline['dof_far'][i]) else "inf",
+				f"{timeline['hyperfocal'][i]:.6f}" if np.isfinite(timeline['hyperfocal'][i]) else "inf",
+			])
+
+# --- Graph Overlay ---
+GRAPH_WIDTH = 320
+GRAPH_HEIGHT = 90
+GRAPH_MARGIN = 15
+
+def graph_range(timeline):
+	"""Upper distance bound of the graph: the largest finite far limit, or twice the focus"""
+	far = timeline["dof_far"]
+	finite_far = far[np.isfinite(far)]
+	top = max(float(timeline["focus_distance"].max()) * 2.0, float(finite_far.max()) if finite_far.size else 0.0)
+	return top if top > 0 else 1.0
+
+def draw_graph(context, timeline):
+	"""Draw a compact near/focus/far graph in the bottom-left corner of the region"""
+
+	frames = timeline["frames"]
+	if len(frames) < 2:
+		return
+
+	ui_scale = context.preferences.view.ui_scale
+	width, height, margin = GRAPH_WIDTH * ui_scale, GRAPH_HEIGHT * ui_scale, GRAPH_MARGIN * ui_scale
+	x0, y0 = margin, margin
+
+	top = graph_range(timeline)
+	xs = x0 + (frames - frames[0]) / float(frames[-1] - frames[0]) * width
+
+	def curve(values):
+		ys = y0 + np.clip(np.nan_to_num(values, posinf=top) / top, 0.0, 1.0) * height
+		return np.column_stack((xs, ys)).astype(np.float32)
+
+	shader = gpu.shader.from_builtin('UNIFORM_COLOR')
+	original_blend = gpu.state.blend_get()
+	gpu.state.blend_set('ALPHA')
+	try:
+		shader.bind()
+
+		# Background
+		background = batch_for_shader(shader, 'TRI_FAN', {
+			"pos": ((x0, y0), (x0 + width, y0), (x0 + width, y0 + height), (x0, y0 + height)),
+		})
+		shader.uniform_float("color", (0.0, 0.0, 0.0, 0.4))
+		background.draw(shader)
+
+		for key, color_type in (("dof_near", 'near'), ("focus_distance", 'focal_plane'), ("dof_far", 'far_max')):
+			batch = batch_for_shader(shader, 'LINE_STRIP', {"pos": curve(timeline[key])})
+			shader.uniform_float("color", get_color_values(color_type))
+			batch.draw(shader)
+
+		# Current frame marker
+		frame = context.scene.frame_current
+		if frames[0] <= frame <= frames[-1]:
+			x = x0 + (frame - frames[0]) / float(frames[-1] - frames[0]) * width
+			marker = batch_for_shader(shader, 'LINES', {"pos": ((x, y0), (x, y0 + height))})
+			shader.uniform_float("color", (1.0, 1.0, 1.0, 0.6))
+			marker.draw(shader)
+	finally:
+		gpu.state.blend_set(original_blend)
+
+	font_id = 0
+	blf.size(font_id, int(10 * ui_scale))
+	blf.color(font_id, 1.0, 1.0, 1.0, 0.7)
+	blf.position(font_id, x0 + 4 * ui_scale, y0 + height - 12 * ui_scale, 0)
+	blf.draw(font_id, f"DoF Timeline (0 - {top:.1f}m)")
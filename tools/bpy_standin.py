@@ -0,0 +1,59 @@
+"""
+Lightweight stand-ins for the few bpy types the overlay's update logic touches.
+
+Only the attributes read by depsgraph_trace.snapshot_update and the replay
+harness are modelled: depsgraph updates with their ID (`bl_rna.identifier`,
+`name`) and update flags, and a context exposing visible objects and the
+scene camera.
+"""
+
+from types import SimpleNamespace
+
+
+class ID:
+	def __init__(self, name, identifier):
+		self.name = name
+		self.bl_rna = SimpleNamespace(identifier=identifier)
+
+class DepsgraphUpdate:
+	def __init__(self, id, is_updated_geometry=False, is_updated_transform=False, is_updated_shading=False):
+		self.id = id
+		self.is_updated_geometry = is_updated_geometry
+		self.is_updated_transform = is_updated_transform
+		self.is_updated_shading = is_updated_shading
+
+class Depsgraph:
+	def __init__(self, updates):
+		self.updates = updates
+
+class Object:
+	def __init__(self, name, type='MESH'):
+		self.name = name
+		self.type = type
+
+class Context:
+	"""Mutable scene state updated from each trace event"""
+
+	def __init__(self):
+		self.visible_objects = []
+		self.scene = SimpleNamespace(camera=None)
+
+	def set_visible(self, names):
+		self.visible_objects = [Object(name) for name in sorted(names)]
+
+	def set_camera(self, name):
+		self.scene.camera = Object(name, 'CAMERA') if name else None
+
+
+def depsgraph_from_records(records):
+	"""Rebuild a stand-in depsgraph from snapshotted update records"""
+	updates = []
+	for record in records:
+		update_id = ID(record["name"], record["type"]) if record["type"] is not None else None
+		updates.append(DepsgraphUpdate(
+			update_id,
+			is_updated_geometry=record["geometry"],
+			is_updated_transform=record["transform"],
+			is_updated_shading=record["shading"],
+		))
+	return Depsgraph(updates)
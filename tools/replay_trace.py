@@ -0,0 +1,156 @@
+"""
+Replay recorded depsgraph traces through the overlay's update logic without Blender.
+
+Traces are recorded from the addon preferences ("Record Depsgraph Trace") and
+contain one event per depsgraph handler call. Each event is replayed through
+change_detection.process_update with a bpy stand-in, so the same classification
+and cache bookkeeping code runs as in Blender. Batch builds are simulated, with an
+optional fixed cost per object to approximate extraction time.
+
+	python tools/replay_trace.py overlay_stutter.jsonl [more.jsonl ...] [--build-cost-ms 0.5] [--output report.json]
+"""
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+import types
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TOOLS_DIR)
+PACKAGE_NAME = "alcove_dof_visualizer"
+
+sys.path.insert(0, TOOLS_DIR)
+import bpy_standin
+
+
+def load_core():
+	"""
+	Import the bpy-free core modules of the addon. The package __init__ (which
+	imports bpy) is bypassed by registering a bare package module first.
+	"""
+	if PACKAGE_NAME not in sys.modules:
+		package = types.ModuleType(PACKAGE_NAME)
+		package.__path__ = [REPO_DIR]
+		sys.modules[PACKAGE_NAME] = package
+
+	return types.SimpleNamespace(
+		batch_cache=importlib.import_module(f"{PACKAGE_NAME}.batch_cache"),
+		change_detection=importlib.import_module(f"{PACKAGE_NAME}.change_detection"),
+		depsgraph_trace=importlib.import_module(f"{PACKAGE_NAME}.depsgraph_trace"),
+		ray_clusters=importlib.import_module(f"{PACKAGE_NAME}.ray_clusters"),
+		scope=importlib.import_module(f"{PACKAGE_NAME}.scope"),
+	)
+
+def new_state(batch_cache):
+	return {
+		"mesh_batches": {},
+		"cache_stats": batch_cache.new_stats(),
+	}
+
+def busy_wait(seconds):
+	end = time.perf_counter() + seconds
+	while time.perf_counter() < end:
+		pass
+
+def replay(core, filepath, build_cost_ms=0.0):
+	"""Replay one trace file and return its report dict"""
+	state = new_state(core.batch_cache)
+	context = bpy_standin.Context()
+	build_cost = build_cost_ms / 1000.0
+	context_visible = set()
+
+	def build(names):
+		for name in names:
+			if name in context_visible:
+				busy_wait(build_cost)
+				core.batch_cache.store_batch(state, name, {"nbytes": 0})
+
+	def rebuild_all():
+		core.batch_cache.clear(state)
+		build(context_visible)
+		state["cached_visible_meshes"] = set(context_visible)
+		state["current_camera"] = context.scene.camera.name if context.scene.camera else None
+
+	samples = []
+	recorded = []
+	worst = []
+
+	for index, event in enumerate(core.depsgraph_trace.load_trace(filepath)):
+		context_visible = event["visible"]
+		context.set_visible(context_visible)
+		context.set_camera(event["camera"])
+		depsgraph = bpy_standin.depsgraph_from_records(event["updates"])
+		records = core.depsgraph_trace.snapshot_updates(depsgraph.updates)
+
+		builds_before = state["cache_stats"]["batch_builds"]
+		start = time.perf_counter()
+		core.change_detection.process_update(
+			state, records,
+			lambda: {obj.name for obj in context.visible_objects if obj.type == 'MESH'},
+			lambda: context.scene.camera.name if context.scene.camera else None,
+			rebuild_all,
+			build,
+		)
+		elapsed = (time.perf_counter() - start) * 1000.0
+
+		samples.append(elapsed)
+		recorded.append(event.get("duration_ms", 0.0))
+		worst.append((event.get("duration_ms", 0.0), index, state["cache_stats"]["batch_builds"] - builds_before))
+
+	worst.sort(reverse=True)
+	return {
+		"trace": filepath,
+		"events": len(samples),
+		"stats": dict(state["cache_stats"]),
+		"replay_ms": summarize(samples),
+		"recorded_ms": summarize(recorded),
+		"slowest_recorded": [
+			{"event": index, "duration_ms": duration, "batch_builds": builds}
+			for duration, index, builds in worst[:5]
+		],
+	}
+
+def summarize(samples):
+	if not samples:
+		return {"total": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+	ordered = sorted(samples)
+	return {
+		"total": sum(ordered),
+		"p50": ordered[int(0.50 * (len(ordered) - 1))],
+		"p95": ordered[int(0.95 * (len(ordered) - 1))],
+		"max": ordered[-1],
+	}
+
+def print_report(report):
+	stats = report["stats"]
+	print(f"\n{report['trace']} ({report['events']} events)")
+	print(f"  full rebuilds: {stats['full_rebuilds']}  batch builds: {stats['batch_builds']}  "
+		f"evictions: {stats['evictions']}  idle updates: {stats['idle_updates']}")
+	for label, key in (("replay", "replay_ms"), ("recorded", "recorded_ms")):
+		summary = report[key]
+		print(f"  {label:<9} total {summary['total']:.2f}ms  p50 {summary['p50']:.3f}ms  "
+			f"p95 {summary['p95']:.3f}ms  max {summary['max']:.3f}ms")
+	for worst in report["slowest_recorded"]:
+		print(f"    event {worst['event']}: {worst['duration_ms']:.2f}ms recorded, {worst['batch_builds']} batch builds")
+
+def main():
+	parser = argparse.ArgumentParser(description="Replay DoF visualizer depsgraph traces")
+	parser.add_argument("traces", nargs="+", help="Trace files recorded from the addon")
+	parser.add_argument("--build-cost-ms", type=float, default=0.0, help="Simulated cost of one batch build")
+	parser.add_argument("--output", help="Write the reports to this JSON file")
+	args = parser.parse_args()
+
+	core = load_core()
+	reports = [replay(core, path, args.build_cost_ms) for path in args.traces]
+	for report in reports:
+		print_report(report)
+
+	if args.output:
+		with open(args.output, "w", encoding="utf-8") as f:
+			json.dump(reports, f, indent=2)
+
+if __name__ == "__main__":
+	main()
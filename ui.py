@@ -1,11 +1,12 @@
-from .properties import get_area_index, get_area_dof_setting
+import bpy
+from .properties import get_area_dof_setting
+from .operators import loaded_module
 
 def draw_dof_viz_checkbox(self, context):
 	layout = self.layout
 	if context.space_data.shading.type in {'SOLID', 'MATERIAL', 'TEXTURED'}:
 		# Check if we're in a valid 3D viewport area
-		area_index = get_area_index(context)
-		if area_index == -1:
+		if context.area is None:
 			return
 
 		layout.separator()
@@ -21,6 +22,8 @@ def draw_dof_viz_checkbox(self, context):
 		show_focal = get_area_dof_setting(context, "show_focal_plane")
 		show_text = get_area_dof_setting(context, "show_text_info")
 		show_limits = get_area_dof_setting(context, "show_dof_limits")
+		show_timeline = get_area_dof_setting(context, "show_dof_timeline")
+		use_exact_contours = get_area_dof_setting(context, "use_exact_contours")
 
 		# Use custom operators to handle area-specific toggling
 		row = sub_layout.row(align=True)
@@ -36,3 +39,170 @@ def draw_dof_viz_checkbox(self, context):
 
 		limits_op = row.operator("dof_viz.toggle_setting", text="DoF Limits", depress=show_limits)
 		limits_op.setting_name = "show_dof_limits"
+
+		row = sub_layout.row(align=True)
+		row.active = show_focal or show_limits
+		contours_op = row.operator("dof_viz.toggle_setting", text="Exact Lines", depress=use_exact_contours)
+		contours_op.setting_name = "use_exact_contours"
+		row.operator("dof_viz.export_contours", text="", icon='CURVE_DATA')
+
+		row = sub_layout.row(align=True)
+		timeline_op = row.operator("dof_viz.toggle_setting", text="Timeline", depress=show_timeline)
+		timeline_op.setting_name = "show_dof_timeline"
+		row.operator("dof_viz.precompute_timeline", text="", icon='FILE_REFRESH')
+		row.operator("dof_viz.export_timeline", text="", icon='EXPORT')
+
+
+#############################################################
+# 
+# Focus Measurement
+# 
+#############################################################
+
+class VIEW3D_PT_dof_viz_focus(bpy.types.Panel):
+	"""Where the distance to the focus object is measured"""
+	bl_space_type = 'VIEW_3D'
+	bl_region_type = 'UI'
+	bl_category = "DoF"
+	bl_label = "Focus Measurement"
+	bl_options = {'DEFAULT_CLOSED'}
+
+	def draw(self, context):
+		layout = self.layout
+		settings = context.scene.dof_viz_focus
+		camera = context.scene.camera
+
+		layout.active = bool(camera and camera.type == 'CAMERA' and camera.data.dof.focus_object)
+		layout.prop(settings, "mode", text="")
+		if settings.mode == 'SCREEN_POINT':
+			layout.prop(settings, "screen_point", text="")
+
+		# Set by the overlay's last focus query; the focus module is only loaded with it
+		focus = loaded_module("focus")
+		if settings.mode != 'ORIGIN' and focus is not None and focus.focus_state["fallback"]:
+			layout.label(text="Ray misses the focus object, using its origin", icon='ERROR')
+
+
+#############################################################
+# 
+# Overlay Scope
+# Collections, frustum and distance filters of the overlay
+# 
+#############################################################
+
+class DOF_VIZ_UL_scope_collections(bpy.types.UIList):
+	"""Collections included in or excluded from the overlay"""
+
+	def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
+		layout.prop(item, "collection", text="", icon='OUTLINER_COLLECTION')
+
+class VIEW3D_PT_dof_viz_scope(bpy.types.Panel):
+	"""Limit the overlay to the objects the shot actually sees"""
+	bl_space_type = 'VIEW_3D'
+	bl_region_type = 'UI'
+	bl_category = "DoF"
+	bl_label = "Overlay Scope"
+	bl_options = {'DEFAULT_CLOSED'}
+
+	def draw(self, context):
+		layout = self.layout
+		settings = context.scene.dof_viz_scope
+
+		layout.prop(settings, "collection_mode", expand=True)
+		if settings.collection_mode != 'ALL':
+			row = layout.row()
+			row.template_list("DOF_VIZ_UL_scope_collections", "", settings, "collections", settings, "active_index", rows=3)
+			col = row.column(align=True)
+			col.operator("dof_viz.scope_collection_add", text="", icon='ADD')
+			col.operator("dof_viz.scope_collection_remove", text="", icon='REMOVE')
+
+		row = layout.row(align=True)
+		row.prop(settings, "use_frustum")
+		sub = row.row(align=True)
+		sub.active = settings.use_frustum
+		sub.prop(settings, "frustum_margin")
+
+		row = layout.row(align=True)
+		row.prop(settings, "use_max_distance")
+		sub = row.row(align=True)
+		sub.active = settings.use_max_distance
+		sub.prop(settings, "max_distance")
+
+
+#############################################################
+# 
+# Focus Analysis Report
+# Sortable list of per-object focus classification results
+# 
+#############################################################
+
+REPORT_SORT_KEYS = {
+	'OUT_OF_FOCUS': lambda item: item.near_frames + item.far_frames,
+	'NEAR': lambda item: item.near_frames,
+	'FAR': lambda item: item.far_frames,
+	'STRADDLE': lambda item: item.straddle_frames,
+	'FOCUS': lambda item: item.focus_frames,
+}
+
+class DOF_VIZ_UL_focus_report(bpy.types.UIList):
+	"""Objects of the focus report with frames spent near-blurred, in focus, far-blurred and straddling"""
+
+	def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
+		row = layout.row(align=True)
+		row.label(text=item.name, icon='OBJECT_DATA')
+		sub = row.row(align=True)
+		sub.alignment = 'RIGHT'
+		sub.label(text=f"{item.near_frames}")
+		sub.label(text=f"{item.focus_frames}")
+		sub.label(text=f"{item.far_frames}")
+		sub.label(text=f"{item.straddle_frames}")
+
+	def filter_items(self, context, data, propname):
+		items = getattr(data, propname)
+		helper = bpy.types.UI_UL_list
+
+		flags = helper.filter_items_by_name(self.filter_name, self.bitflag_filter_item, items, "name")
+		if data.sort_key == 'NAME':
+			order = helper.sort_items_by_name(items, "name")
+			if data.sort_reverse:
+				order = [len(items) - 1 - i for i in order]
+		else:
+			key = REPORT_SORT_KEYS[data.sort_key]
+			ranked = sorted(range(len(items)), key=lambda i: key(items[i]), reverse=data.sort_reverse)
+			order = [0] * len(items)
+			for position, i in enumerate(ranked):
+				order[i] = position
+		return flags, order
+
+class VIEW3D_PT_dof_viz_report(bpy.types.Panel):
+	"""Focus classification of objects across the frame range"""
+	bl_space_type = 'VIEW_3D'
+	bl_region_type = 'UI'
+	bl_category = "DoF"
+	bl_label = "Focus Report"
+
+	def draw(self, context):
+		layout = self.layout
+		report = context.scene.dof_viz_report
+
+		row = layout.row(align=True)
+		row.operator("dof_viz.analyze_focus", icon='VIEWZOOM')
+		row.operator("dof_viz.export_focus_report", text="", icon='EXPORT')
+		layout.operator("dof_viz.render_coc_maps", icon='RENDER_STILL')
+
+		if not report.items:
+			layout.label(text="No analysis yet")
+			return
+
+		layout.label(text=f"{report.camera}, frames {report.frame_start}-{report.frame_end}")
+		row = layout.row(align=True)
+		row.prop(report, "sort_key", text="")
+		row.prop(report, "sort_reverse", text="", icon='SORT_DESC' if report.sort_reverse else 'SORT_ASC')
+
+		header = layout.row()
+		header.label(text="Object")
+		sub = header.row()
+		sub.alignment = 'RIGHT'
+		sub.label(text="Near / Focus / Far / Straddle")
+
+		layout.template_list("DOF_VIZ_UL_focus_report", "", report, "items", report, "active_index", rows=8)